@@ -18,6 +18,22 @@ class AccountReconciliationWidget(models.AbstractModel):
         )
         return results
 
+    @api.model
+    def process_bank_statement_line(self, st_line_ids, data):
+        """
+        Process all statement lines in one job instead of one job per line.
+        """
+        batch = list()
+        res = super(
+            AccountReconciliationWidget, self.with_context(reconcile_batch=batch)
+        ).process_bank_statement_line(st_line_ids, data)
+        if batch:
+            st_lines = self.env["account.bank.statement.line"].browse(
+                [line_data[0] for line_data in batch])
+            st_lines.with_delay()._process_reconciliation_batch(
+                [line_data[1:] for line_data in batch])
+        return res
+
     @api.model
     def get_move_lines_for_bank_statement_line(self, st_line_id, partner_id=None,
                                                excluded_ids=None, search_str=False,
@@ -15,9 +15,11 @@ from odoo.addons.sponsorship_compassion.models.product_names import (
     GIFT_CATEGORY,
     SPONSORSHIP_CATEGORY,
 )
-from odoo.exceptions import UserError
-from odoo.tools import mod10r
+from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
+from odoo.tools import html_escape, mod10r
 from functools import reduce
+from itertools import groupby
 
 logger = logging.getLogger(__name__)
 
@@ -135,23 +137,138 @@ class BankStatementLine(models.Model):
     def process_reconciliation(
             self, counterpart_aml_dicts=None, payment_aml_rec=None, new_aml_dicts=None
     ):
-        self.with_delay()._process_reconciliation(
-            counterpart_aml_dicts, payment_aml_rec, new_aml_dicts
-        )
+        batch = self.env.context.get("reconcile_batch")
+        if batch is not None:
+            # The reconciliation widget will process all lines in one job
+            batch.append(
+                (self.id, counterpart_aml_dicts, payment_aml_rec, new_aml_dicts))
+        else:
+            self.with_delay()._process_reconciliation(
+                counterpart_aml_dicts, payment_aml_rec, new_aml_dicts
+            )
         return self.env["account.move"]
 
-    def _create_invoice_from_mv_lines(self, mv_line_dicts, invoice=None):
-        # Generate a unique bvr_reference
+    @api.multi
+    def _process_reconciliation_batch(self, lines_data):
+        """
+        Process the reconciliation of several statement lines, grouped by
+        partner. The new invoices of a partner are created at once, then each
+        line is reconciled with its own counterpart, in its own savepoint:
+        a line failing with a user error is reported and doesn't abort the
+        batch. Other errors (concurrent updates) fail the job to retry it.
+        :param lines_data: list of (counterpart_aml_dicts, payment_aml_rec,
+                           new_aml_dicts) given in the order of the lines.
+        :return: summary of the processing
+        """
+        failures = dict()
+        to_process = sorted(
+            zip(self, lines_data), key=lambda data: data[0].partner_id.id or 0)
+        for _partner, group in groupby(
+                to_process, key=lambda data: data[0].partner_id):
+            group = list(group)
+            st_lines = self.browse([st_line.id for st_line, _data in group])
+            try:
+                with self.env.cr.savepoint():
+                    invoices = st_lines._create_reconcile_invoices(
+                        [reconcile_data for _st_line, reconcile_data in group])
+            except (UserError, ValidationError):
+                # Invoices will be created line by line to report the error
+                logger.warning(
+                    "Batch invoice creation failed for statement lines %s",
+                    st_lines.ids,
+                    exc_info=True,
+                )
+                invoices = dict()
+            for st_line, reconcile_data in group:
+                invoice = invoices.get(st_line.id)
+                try:
+                    with self.env.cr.savepoint():
+                        st_line.with_context(
+                            reconcile_invoices=invoices
+                        )._process_reconciliation(*reconcile_data)
+                except (UserError, ValidationError) as error:
+                    logger.error(
+                        "Reconciliation of statement line %s failed",
+                        st_line.id,
+                        exc_info=True,
+                    )
+                    if invoice:
+                        invoice.unlink()
+                    failures.setdefault(st_line.statement_id, []).append(
+                        html_escape(
+                            f"{st_line.name} ({st_line.amount}): {error.name}")
+                    )
+        for statement, errors in failures.items():
+            statement.message_post(
+                body=_("Some lines could not be reconciled:") + "<ul><li>"
+                + "</li><li>".join(errors) + "</li></ul>",
+                subject=_("Reconciliation errors"),
+            )
+        nb_failures = sum(len(errors) for errors in failures.values())
+        return f"{len(self) - nb_failures} lines reconciled, {nb_failures} failed."
+
+    @api.multi
+    def _create_reconcile_invoices(self, lines_data):
+        """
+        Creates at once the draft invoices and invoice lines of the statement
+        lines needing a new invoice (product set in the new move lines, and
+        no existing invoice to put the amount in).
+        :param lines_data: reconciliation data of the lines (see
+                           _process_reconciliation_batch)
+        :return: dict {statement line id: account.invoice record}
+        """
+        to_invoice = list()
+        for st_line, reconcile_data in zip(self, lines_data):
+            counterpart_aml_dicts, _payment_aml_rec, new_aml_dicts = reconcile_data
+            mv_line_dicts = [
+                data for data in new_aml_dicts or [] if data.get("product_id")
+            ]
+            for mv_line_dict in mv_line_dicts:
+                mv_line_dict["partner_id"] = st_line.partner_id.id
+            if (
+                mv_line_dicts
+                and not any(
+                    data["move_line"].invoice_id
+                    for data in counterpart_aml_dicts or []
+                )
+                and not st_line._find_open_invoice(mv_line_dicts)
+            ):
+                to_invoice.append((st_line, mv_line_dicts))
+        if not to_invoice:
+            return dict()
+
+        invoices = self.env["account.invoice"].create([
+            st_line._get_invoice_data(
+                st_line._get_invoice_reference(), mv_line_dicts)
+            for st_line, mv_line_dicts in to_invoice
+        ])
+        # Copies are used, the lines could be processed again without batch
+        self.env["account.invoice.line"].create([
+            st_line._get_invoice_line_data(dict(mv_line_dict), invoice)
+            for (st_line, mv_line_dicts), invoice in zip(to_invoice, invoices)
+            for mv_line_dict in mv_line_dicts
+        ])
+        return {
+            st_line.id: invoice
+            for (st_line, _mv_line_dicts), invoice in zip(to_invoice, invoices)
+        }
+
+    def _get_invoice_reference(self):
+        """ Generate a unique bvr_reference for the statement line. """
         if self.ref and len(self.ref) == 27:
-            ref = self.ref
-        elif self.ref and len(self.ref) > 27:
-            ref = mod10r(self.ref[:26])
-        else:
-            ref = mod10r(
-                str(self.date).replace("-", "")
-                + str(self.statement_id.id)
-                + str(self.id)
-            ).ljust(26, "0")
+            return self.ref
+        if self.ref and len(self.ref) > 27:
+            return mod10r(self.ref[:26])
+        return mod10r(
+            str(self.date).replace("-", "")
+            + str(self.statement_id.id)
+            + str(self.id)
+        ).ljust(26, "0")
+
+    def _create_invoice_from_mv_lines(self, mv_line_dicts, invoice=None):
+        ref = self._get_invoice_reference()
+        # Invoice already created with the other lines of a batch
+        batch_invoice = self.env.context.get("reconcile_invoices", {}).get(self.id)
 
         if invoice:
             invoice.action_invoice_cancel()
@@ -159,6 +276,9 @@ class BankStatementLine(models.Model):
             invoice.env.clear()
             invoice.write({"origin": self.statement_id.name})
 
+        elif batch_invoice:
+            invoice = batch_invoice
+
         else:
             # Lookup for an existing open invoice matching the criterias
             invoices = self._find_open_invoice(mv_line_dicts)
@@ -177,9 +297,15 @@ class BankStatementLine(models.Model):
             inv_data = self._get_invoice_data(ref, mv_line_dicts)
             invoice = self.env["account.invoice"].create(inv_data)
 
-        for mv_line_dict in mv_line_dicts:
-            inv_line_data = self._get_invoice_line_data(mv_line_dict, invoice)
-            self.env["account.invoice.line"].create(inv_line_data)
+        if batch_invoice:
+            # Same cleanup as _get_invoice_line_data
+            for mv_line_dict in mv_line_dicts:
+                mv_line_dict.pop("analytic_account_id", False)
+        else:
+            self.env["account.invoice.line"].create([
+                self._get_invoice_line_data(mv_line_dict, invoice)
+                for mv_line_dict in mv_line_dicts
+            ])
 
         invoice.action_invoice_open()
         self.ref = ref
@@ -266,18 +392,20 @@ class BankStatementLine(models.Model):
     def _find_open_invoice(self, mv_line_dicts):
         """ Find an open invoice that matches the statement line and which
         could be reconciled with. """
-        invoice_line_obj = self.env["account.invoice.line"]
-        inv_lines = invoice_line_obj
-        for mv_line_dict in mv_line_dicts:
-            amount = mv_line_dict["credit"]
-            inv_lines |= invoice_line_obj.search(
-                [
-                    ("partner_id", "child_of", mv_line_dict.get("partner_id")),
-                    ("invoice_id.state", "in", ("open", "draft")),
-                    ("product_id", "=", mv_line_dict.get("product_id")),
-                    ("price_subtotal", "=", amount),
-                ]
-            )
+        # Search all lines at once, each one with its partner, product and amount
+        inv_lines = self.env["account.invoice.line"].search(
+            expression.AND([
+                [("invoice_id.state", "in", ("open", "draft"))],
+                expression.OR([
+                    [
+                        ("partner_id", "child_of", mv_line_dict.get("partner_id")),
+                        ("product_id", "=", mv_line_dict.get("product_id")),
+                        ("price_subtotal", "=", mv_line_dict["credit"]),
+                    ]
+                    for mv_line_dict in mv_line_dicts
+                ]),
+            ])
+        )
 
         return inv_lines.mapped("invoice_id").filtered(
             lambda i: i.amount_total == self.amount
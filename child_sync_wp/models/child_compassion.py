@@ -128,13 +128,24 @@ class CompassionChild(models.Model):
         return global_pool
 
     def _update_information_and_filter_invalid(self, children):
+        """
+        Updates the children through the message center, which keeps the
+        GMC messages and their state. Projects shared by several children
+        are updated only once. Children whose update failed are kept with
+        their current information.
+        """
         for child in children:
             try:
-                child.get_infos()
-                child.mapped("project_id").update_informations()
-            except:
+                with self.env.cr.savepoint():
+                    child.get_infos()
+            except Exception:
                 logger.error("Error updating child information: ", exc_info=True)
-                continue
+        for project in children.mapped("project_id"):
+            try:
+                with self.env.cr.savepoint():
+                    project.update_informations()
+            except Exception:
+                logger.error("Error updating project information: ", exc_info=True)
         return children.filtered(
             lambda c: c.state == "N"
             and c.desc_it
@@ -168,16 +179,13 @@ class CompassionChild(models.Model):
         try:
             with self.env.cr.savepoint():
                 old_children.force_remove_from_wordpress(company_id)
-                # Put children 5 by 5 to avoid delays
-                for i in range(0, len(new_children), 5):
-                    try:
-                        new_children[i: i + 5].add_to_wordpress(company_id)
-                    except:
-                        logger.error(
-                            "Failed adding a batch of children to" " wordpress: ",
-                            exc_info=True,
-                        )
-                        continue
+                # Children are sent by batches, failures are logged per child
+                try:
+                    new_children.add_to_wordpress(company_id)
+                except:
+                    logger.error(
+                        "Failed adding children to wordpress: ", exc_info=True
+                    )
 
                 old_children.mapped("hold_id").release_hold()
         except:
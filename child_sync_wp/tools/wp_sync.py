@@ -8,14 +8,39 @@
 #
 ##############################################################################
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from xmlrpc.client import ServerProxy, SafeTransport, GzipDecodedResponse
+from xmlrpc.client import (
+    ServerProxy, SafeTransport, GzipDecodedResponse, MultiCall, Fault
+)
 
 _logger = logging.getLogger(__name__)
 
+READ_BUFFER_SIZE = 64 * 1024
+# Number of children sent in one system.multicall request
+BATCH_SIZE = 10
+# Number of requests sent concurrently to Wordpress
+MAX_WORKERS = 3
+TIMEOUT = 120
+
 
 # Solves XMLRPC Parse response problems by stripping response
 class CustomTransport(SafeTransport):
+    """
+    The connection is kept alive between requests (HTTP/1.1), so that one
+    transport should be used by only one thread at a time.
+    """
+
+    def __init__(self, timeout=TIMEOUT, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
     def parse_response(self, response):
         # read response data from httpresponse, and parse it
 
@@ -30,14 +55,19 @@ class CustomTransport(SafeTransport):
 
         p, u = self.getparser()
 
+        started = False
         while 1:
-            data = stream.read(1024)
-            data = data.strip()
+            data = stream.read(READ_BUFFER_SIZE)
             if not data:
                 break
+            if not started:
+                # Wordpress can output whitespaces before the XML declaration
+                data = data.lstrip()
+                started = bool(data)
             if self.verbose:
                 _logger.info("body: " + repr(data))
-            p.feed(data)
+            if data:
+                p.feed(data)
 
         if stream is not response:
             stream.close()
@@ -48,15 +78,99 @@ class CustomTransport(SafeTransport):
 
 class WPSync(object):
     def __init__(self, wp_config):
-        self.xmlrpc_server = ServerProxy(
-            "https://" + wp_config.host + "/xmlrpc.php", transport=CustomTransport()
-        )
+        self.url = "https://" + wp_config.host + "/xmlrpc.php"
+        self.xmlrpc_server = ServerProxy(self.url, transport=CustomTransport())
         self.user = wp_config.user
         self.pwd = wp_config.password
+        self._local = threading.local()
+
+    def _get_thread_server(self):
+        """ Each worker thread gets its own persistent connection. """
+        server = getattr(self._local, "server", None)
+        if server is None:
+            server = ServerProxy(self.url, transport=CustomTransport())
+            self._local.server = server
+        return server
 
     def test_xmlrpc(self):
         return self.xmlrpc_server.demo.sayHello()
 
+    @staticmethod
+    def _get_child_values(child):
+        return {
+            "local_id": child.local_id,
+            "number": child.local_id,
+            "first_name": child.preferred_name,
+            "name": child.name,
+            "full_name": child.name,
+            "birthday": child.birthdate,
+            "gender": child.gender,
+            # CO-1003 in case child has no unsponsored_since date,
+            # we use allocation date
+            "start_date": child.unsponsored_since or child.date,
+            "desc": child.desc_fr,
+            "desc_de": child.desc_de,
+            "desc_it": child.desc_it,
+            "country": child.project_id.country_id.name,
+            "project": child.project_id.description_fr,
+            "project_de": child.project_id.description_de,
+            "project_it": child.project_id.description_it,
+            "cloudinary_url": child.image_url,
+        }
+
+    def _add_children_batch(self, batch):
+        """
+        Sends several children in one system.multicall request. This is run
+        in worker threads and must not touch the ORM.
+        :param batch: list of tuples (child_id, child_values)
+        :return: list of tuples (child_id, error message or False)
+        """
+        multicall = MultiCall(self._get_thread_server())
+        for child_id, child_values in batch:
+            multicall.child_import.addChild(self.user, self.pwd, child_values)
+        try:
+            results = list(multicall().results)
+        except Exception as error:
+            # Drop the connection that may be in a broken state
+            self._local.server = None
+            _logger.error("Child Upload batch failed: ", exc_info=True)
+            return [(child_id, str(error)) for child_id, values in batch]
+        res = []
+        for (child_id, child_values), result in zip(batch, results):
+            if isinstance(result, dict):
+                error = Fault(result["faultCode"], result["faultString"])
+                res.append((child_id, str(error)))
+            elif not result or not result[0]:
+                res.append((child_id, "Wordpress refused the child"))
+            else:
+                res.append((child_id, False))
+        return res
+
+    def publish_children(self, children, batch_size=BATCH_SIZE,
+                         max_workers=MAX_WORKERS):
+        """ Push children to Wordpress website.
+
+        The children are sent by batches using system.multicall, and the
+        batches are sent concurrently by a small pool of workers.
+
+        :param children: compassion.child recordset
+        :return: dict {child_id: error message or False if published}
+        """
+        values = [(child.id, self._get_child_values(child)) for child in children]
+        batches = [
+            values[i:i + batch_size] for i in range(0, len(values), batch_size)
+        ]
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_result in executor.map(self._add_children_batch, batches):
+                results.update(batch_result)
+                _logger.info(
+                    "Pushed children %s/%s", len(results), len(children))
+        for child_id, error in results.items():
+            if error:
+                _logger.error("Child %s Upload failed: %s", child_id, error)
+        return results
+
     def upload_children(self, children):
         """ Push children to Wordpress website.
 
@@ -65,45 +179,13 @@ class WPSync(object):
         not uploaded as file anymore
 
         :param children: compassion.child recordset
-        :return: result of xmlrpc call to wordpress (true/false)
+        :return: number of children imported
         """
-        count_insert = 0
-
-        for child in children:
-            _logger.info(
-                "Pushing child %s/%s",
-                count_insert + 1, len(children)
-            )
-            try:
-                child_values = {
-                    "local_id": child.local_id,
-                    "number": child.local_id,
-                    "first_name": child.preferred_name,
-                    "name": child.name,
-                    "full_name": child.name,
-                    "birthday": child.birthdate,
-                    "gender": child.gender,
-                    # CO-1003 in case child has no unsponsored_since date,
-                    # we use allocation date
-                    "start_date": child.unsponsored_since or child.date,
-                    "desc": child.desc_fr,
-                    "desc_de": child.desc_de,
-                    "desc_it": child.desc_it,
-                    "country": child.project_id.country_id.name,
-                    "project": child.project_id.description_fr,
-                    "project_de": child.project_id.description_de,
-                    "project_it": child.project_id.description_it,
-                    "cloudinary_url": child.image_url,
-                }
-                if self.xmlrpc_server.child_import.addChild(
-                        self.user, self.pwd, child_values
-                ):
-                    count_insert += 1
-                    child.state = "I"
-                    children.env.cr.commit()
-            except:
-                children.env.clear()
-                _logger.error("Child Upload failed: ", exc_info=True)
+        results = self.publish_children(children)
+        published = children.browse(
+            [child_id for child_id, error in results.items() if not error])
+        published.write({"state": "I"})
+        count_insert = len(published)
 
         if count_insert == len(children):
             _logger.info(
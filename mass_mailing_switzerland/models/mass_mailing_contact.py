@@ -18,6 +18,28 @@ from odoo.addons.queue_job.job import job
 
 logger = logging.getLogger(__name__)
 
+# Merge fields computed with compassion.child.get(keyword)
+CHILD_GRAMMAR_FIELDS = {
+    "sponsored_child_is": "is",
+    "sponsored_child_was": "was",
+    "sponsored_child_will_be": "will be",
+    "sponsored_child_his": "his",
+    "sponsored_child_sein": "sein",
+    "sponsored_child_seine": "seine",
+    "sponsored_child_seinen": "seinen",
+    "sponsored_child_seinem": "seinem",
+    "sponsored_child_seiner": "seiner",
+    "sponsored_child_ihm": "ihm",
+    "sponsored_child_ihn": "ihn",
+    "sponsored_child_son": "son",
+    "sponsored_child_sa": "sa",
+    "sponsored_child_ses": "ses",
+    "sponsored_child_lui_leur": "lui_leur",
+    "sponsored_child_lui_elle": "lui_elle",
+    "sponsored_child_le_la": "le_la",
+    "sponsored_child_your_child": "your sponsored child",
+}
+
 
 class MassMailingContact(models.Model):
     _inherit = "mail.mass_mailing.contact"
@@ -155,52 +177,53 @@ class MassMailingContact(models.Model):
     def _compute_sponsored_child_fields(self):
         country_filter_id = self.env["res.config.settings"].get_param(
             "mass_mailing_country_filter_id")
+        # Load the children of all contacts first, to fetch their data at once
+        contact_children = {}
         for contact in self:
             partners = contact.partner_ids.with_context(lang=contact.partner_id.lang)
             # Allow option to take a child given in context, otherwise take
-            sponsored_child_ids = partners.mapped("sponsored_child_ids")
             # the sponsored children.
-            child = self.env.context.get("mailchimp_child", sponsored_child_ids)
+            child = self.env.context.get(
+                "mailchimp_child", partners.mapped("sponsored_child_ids")
+            ).with_context(lang=contact.partner_id.lang)
             contact.numspons = len(list(child))
             if country_filter_id:
                 child = child.filtered(
                     lambda c: c.field_office_id.id == country_filter_id)
+            contact_children[contact.id] = child
+        all_children = self.env["compassion.child"].union(
+            *contact_children.values())
+
+        # Children having written a B2S letter in the last year
+        one_year_ago = date.today() - relativedelta(years=1)
+        recent_letters = self.env["correspondence"].read_group([
+            ("child_id", "in", all_children.ids),
+            ("direction", "=", "Beneficiary To Supporter"),
+            ("scanned_date", ">=", one_year_ago)
+        ], ["child_id"], ["child_id"])
+        recent_child_ids = {group["child_id"][0] for group in recent_letters}
+
+        # The grammar only depends on the language and genders of children
+        grammar_cache = {}
+        for contact in self:
+            child = contact_children[contact.id]
+            grammar_key = (
+                contact.partner_id.lang,
+                tuple(sorted(child.mapped("gender"))),
+            )
+            if grammar_key not in grammar_cache:
+                grammar_cache[grammar_key] = {
+                    field_name: child.get(keyword)
+                    for field_name, keyword in CHILD_GRAMMAR_FIELDS.items()
+                }
+            contact.update(grammar_cache[grammar_key])
             contact.sponsored_child_image = child.filtered(
                 'image_url')[:1].thumbnail_url or ''
             contact.sponsored_child_name = child.get_list(
                 "preferred_name", 3, child.get_number(), translate=False)
             contact.sponsored_child_reference = child.get_list("local_id")
-            contact.sponsored_child_is = child.get("is")
-            contact.sponsored_child_was = child.get("was")
-            contact.sponsored_child_will_be = child.get("will be")
-            contact.sponsored_child_he = child.get("he")
-            contact.sponsored_child_his = child.get("his")
-            contact.sponsored_child_sein = child.get("sein")
-            contact.sponsored_child_seine = child.get("seine")
-            contact.sponsored_child_seinen = child.get("seinen")
-            contact.sponsored_child_seinem = child.get("seinem")
-            contact.sponsored_child_seiner = child.get("seiner")
-            contact.sponsored_child_ihm = child.get("ihm")
-            contact.sponsored_child_ihn = child.get("ihn")
-            contact.sponsored_child_son = child.get("son")
-            contact.sponsored_child_sa = child.get("sa")
-            contact.sponsored_child_ses = child.get("ses")
-            contact.sponsored_child_lui_leur = child.get("lui_leur")
-            contact.sponsored_child_lui_elle = child.get("lui_elle")
-            contact.sponsored_child_le_la = child.get("le_la")
-            contact.sponsored_child_your_child = child.get("your sponsored child")
             # Pending B2S letters for more than 1 year
-            pending_b2s_child = self.env["compassion.child"].with_context(
-                lang=contact.partner_id.lang)
-            one_year_ago = date.today() - relativedelta(years=1)
-            for one_child in child:
-                recent_letters = self.env["correspondence"].search_count([
-                    ("child_id", "=", one_child.id),
-                    ("direction", "=", "Beneficiary To Supporter"),
-                    ("scanned_date", ">=", one_year_ago)
-                ])
-                if not recent_letters:
-                    pending_b2s_child += one_child
+            pending_b2s_child = child.filtered(lambda c: c.id not in recent_child_ids)
             contact.pending_letter_child_names = pending_b2s_child.get_list(
                 "preferred_name", translate=False)
 
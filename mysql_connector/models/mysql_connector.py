@@ -8,6 +8,10 @@
 #
 ##############################################################################
 import logging
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue, Empty, Full
+
 from odoo.tools.config import config
 
 logger = logging.getLogger(__name__)
@@ -17,6 +21,62 @@ try:
 except ImportError:
     logger.warning("Please install MySQLdb")
 
+# Maximum number of idle connections kept per MySQL server
+POOL_SIZE = 5
+# Number of rows inserted by one statement in upsert_many
+UPSERT_BATCH_SIZE = 500
+# Number of rows fetched at once by select_iter
+FETCH_SIZE = 1000
+
+
+class MysqlConnectionPool(object):
+    """ Process-wide pool of connections to one MySQL server. """
+
+    _pools = {}
+    _lock = threading.Lock()
+
+    def __init__(self, connect_args, size=POOL_SIZE):
+        self.connect_args = connect_args
+        self.idle = LifoQueue(maxsize=size)
+
+    @classmethod
+    def get(cls, host, user, password, db):
+        key = (host, user, db)
+        with cls._lock:
+            pool = cls._pools.get(key)
+            if pool is None or pool.connect_args[2] != password:
+                pool = cls._pools[key] = cls((host, user, password, db))
+            return pool
+
+    def acquire(self):
+        """ Returns a healthy connection, reusing an idle one if possible. """
+        while True:
+            try:
+                con = self.idle.get_nowait()
+            except Empty:
+                break
+            try:
+                con.ping()
+                return con
+            except MySQLdb.Error:
+                self._close(con)
+        return MySQLdb.connect(*self.connect_args, charset="utf8")
+
+    def release(self, con):
+        """ Gives back a connection to the pool, discarding its transaction. """
+        try:
+            con.rollback()
+            self.idle.put_nowait(con)
+        except (MySQLdb.Error, Full):
+            self._close(con)
+
+    @staticmethod
+    def _close(con):
+        try:
+            con.close()
+        except MySQLdb.Error:
+            pass
+
 
 class MysqlConnector(object):
 
@@ -31,22 +91,48 @@ class MysqlConnector(object):
             mysql_pw="mysql_pw",
             mysql_db="mysql_db",
     ):
-        """Establishes the connection to the MySQL server used."""
+        """Takes a connection to the MySQL server from the pool."""
         mh = config.get(mysql_host)
         mu = config.get(mysql_user)
         mp = config.get(mysql_pw)
         md = config.get(mysql_db)
         self._con = False
+        self._in_transaction = False
+        self._pool = MysqlConnectionPool.get(mh, mu, mp, md)
         try:
-            self._con = MySQLdb.connect(mh, mu, mp, md, charset="utf8")
+            self._con = self._pool.acquire()
             self._cur = self._con.cursor(MySQLdb.cursors.DictCursor)
         except MySQLdb.Error as e:
             logger.debug(f"Error {e.args[0]}: {e.args[1]}")
 
     def __del__(self):
-        """ Close the MySQL connection. """
+        """ Give back the MySQL connection to the pool. """
+        self.close()
+
+    def close(self):
         if self._con:
-            self._con.close()
+            self._cur.close()
+            self._pool.release(self._con)
+            self._con = False
+
+    @contextmanager
+    def transaction(self):
+        """ Context manager grouping the queries in a single transaction,
+        that is committed at the end of the block or rolled back in case of
+        error.
+        """
+        if self._in_transaction:
+            yield self
+            return
+        self._in_transaction = True
+        try:
+            yield self
+            self._con.commit()
+        except Exception:
+            self._con.rollback()
+            raise
+        finally:
+            self._in_transaction = False
 
     def query(self, statement, args=None):
         """ Performs a MySQL query that has no return value.
@@ -63,7 +149,8 @@ class MysqlConnector(object):
         if args and not isinstance(args, (list, tuple, dict)):
             args = [args]
         self._cur.execute(statement, args)
-        self._con.commit()
+        if not self._in_transaction:
+            self._con.commit()
         return self._cur.lastrowid or True
 
     def select_one(self, statement, args=None):
@@ -108,12 +195,42 @@ class MysqlConnector(object):
         self._cur.execute(statement, args)
         return self._cur.fetchall() or list()
 
+    def select_iter(self, statement, args=None, fetch_size=FETCH_SIZE):
+        """ Performs a MySQL SELECT statement and iterates over the rows.
+        The rows are kept on the server side and fetched by small chunks,
+        which allows reading big tables without loading them in memory.
+        The connection cannot be used for other queries until all rows
+        are read.
+        Args:
+            - statement (string) : the query to be executed.
+            - args (list or dict) : the arguments of the query.
+            - fetch_size (int) : number of rows fetched at once.
+        Returns :
+            - Generator of dictionaries containing the selected field names
+              as keys with their values.
+        """
+        if args and not isinstance(args, (list, tuple, dict)):
+            args = [args]
+        cursor = self._con.cursor(MySQLdb.cursors.SSDictCursor)
+        try:
+            cursor.execute(statement, args)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            cursor.close()
+
     def is_alive(self):
         """ Test if the connection is alive. """
+        if not self._con:
+            return False
         try:
-            self.select_one("SELECT VERSION()")
+            self._con.ping()
             return True
-        except Exception:
+        except MySQLdb.Error:
             return False
 
     def _get_gp_uid(self, uid):
@@ -139,3 +256,31 @@ class MysqlConnector(object):
         log_string = "UPSERT {0}({1}) WITH VALUES ({2})"
         logger.debug(log_string.format(table, col_string, val_string) % tuple(values))
         return self.query(sql_query, values)
+
+    def upsert_many(self, table, rows, batch_size=UPSERT_BATCH_SIZE):
+        """Inserts or updates several rows in a single transaction, using
+        multi-row UPSERT queries. All rows must have the same keys.
+        Args:
+            - table (string) : the table name.
+            - rows (list of dict) : the values to insert/update.
+            - batch_size (int) : number of rows sent in one query.
+        Returns:
+            - Number of rows sent.
+        """
+        if not rows:
+            return 0
+        cols = list(rows[0].keys())
+        col_string = ",".join(cols)
+        row_string = "(" + ",".join(["%s"] * len(cols)) + ")"
+        update_string = ",".join([key + "=VALUES(" + key + ")" for key in cols])
+        with self.transaction():
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i:i + batch_size]
+                sql_query = "INSERT INTO {0}({1}) VALUES {2} " \
+                    "ON DUPLICATE KEY UPDATE {3}".format(
+                        table, col_string, ",".join([row_string] * len(batch)),
+                        update_string)
+                values = [row[col] for row in batch for col in cols]
+                logger.debug("UPSERT %s rows in %s", len(batch), table)
+                self.query(sql_query, values)
+        return len(rows)
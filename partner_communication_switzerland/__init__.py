@@ -12,3 +12,4 @@ from . import models
 from . import wizards
 from . import controllers
 from . import forms
+from . import tools
@@ -0,0 +1,22 @@
+import logging
+from openupgradelib import openupgrade
+
+_logger = logging.getLogger(__name__)
+
+
+@openupgrade.migrate(use_env=True)
+def migrate(env, installed_version):
+    if not installed_version:
+        return
+
+    # Fill the communication related objects table from object_ids field
+    env.cr.execute("""
+        INSERT INTO partner_communication_object (job_id, res_model, res_id)
+        SELECT DISTINCT j.id, m.model, trim(o.res_id)::integer
+        FROM partner_communication_job j
+        JOIN partner_communication_config c ON j.config_id = c.id
+        JOIN ir_model m ON c.model_id = m.id
+        CROSS JOIN LATERAL regexp_split_to_table(j.object_ids, ',') AS o(res_id)
+        WHERE trim(o.res_id) ~ '^[0-9]+$'
+    """)
+    _logger.info("%s communication related objects created", env.cr.rowcount)
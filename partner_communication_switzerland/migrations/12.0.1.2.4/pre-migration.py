@@ -0,0 +1,15 @@
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, installed_version):
+    if not installed_version:
+        return
+
+    # Fill the children birthday key with SQL instead of ORM computation
+    if not openupgrade.column_exists(env.cr, "compassion_child", "birthday_month_day"):
+        env.cr.execute("""
+            ALTER TABLE compassion_child ADD COLUMN birthday_month_day varchar;
+            UPDATE compassion_child SET birthday_month_day = to_char(birthdate, 'MM-DD')
+            WHERE birthdate IS NOT NULL;
+        """)
@@ -17,6 +17,7 @@ from . import contracts
 from . import res_partner
 from . import disaster_alert
 from . import partner_communication
+from . import partner_communication_attachment
 from . import account_invoice
 from . import account_invoice_line
 from . import payment_order
@@ -28,3 +29,5 @@ from . import res_partner_zoom_session
 from . import res_partner_zoom_attendee
 from . import field_office
 from . import partner_communication_config
+from . import partner_communication_object
+from . import tax_receipt_run
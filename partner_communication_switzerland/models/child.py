@@ -54,6 +54,16 @@ class CompassionChild(models.Model):
     old_firstname = fields.Char(compute="_compute_revised_values")
     current_values = fields.Char(compute="_compute_revised_values")
     completion_month = fields.Char(compute="_compute_completion_month")
+    birthday_month_day = fields.Char(
+        compute="_compute_birthday_month_day", store=True, index=True,
+        help="Birthday in MM-DD format, used for finding birthdays"
+    )
+
+    @api.depends("birthdate")
+    def _compute_birthday_month_day(self):
+        for child in self:
+            child.birthday_month_day = child.birthdate and child.birthdate.strftime(
+                "%m-%d")
 
     def _compute_revised_values(self):
         for child in self:
@@ -45,7 +45,8 @@ class RecurringContract(models.Model):
         compute="_compute_period_paid",
         help="Tells if the advance billing period is already paid",
     )
-    months_due = fields.Integer(compute="_compute_due_invoices", store=True)
+    months_due = fields.Integer(
+        compute="_compute_due_invoices", store=True, index=True)
     send_introduction_letter = fields.Boolean(
         string="Send B2S intro letter to sponsor", default=True
     )
@@ -149,28 +150,41 @@ class RecurringContract(models.Model):
     def _compute_due_invoices(self):
         """
         Useful for reminders giving open invoices in the past.
+        The values are computed with one aggregate query per batch of
+        contracts.
         """
         this_month = date.today().replace(day=1)
+        due_data = {}
+        contract_ids = [c.id for c in self if isinstance(c.id, int)]
+        for ids in self.env.cr.split_for_in_conditions(contract_ids):
+            self.env.cr.execute(
+                """
+                SELECT l.contract_id, array_agg(DISTINCT i.id),
+                    sum(l.price_subtotal),
+                    count(DISTINCT date_trunc('month', i.date))
+                FROM account_invoice_line l
+                JOIN account_invoice i ON l.invoice_id = i.id
+                WHERE l.contract_id IN %s
+                AND i.state = 'open'
+                AND i.date_due < %s
+                AND COALESCE(i.invoice_category, '') != 'gift'
+                GROUP BY l.contract_id
+            """,
+                [ids, this_month],
+            )
+            due_data.update(
+                (row[0], row[1:]) for row in self.env.cr.fetchall()
+            )
         for contract in self:
             if (
                     contract.child_id.project_id.suspension != "fund-suspended"
                     and contract.type not in ["SC", "SWP"]
             ):
-                invoice_lines = contract.invoice_line_ids.with_context(
-                    lang="en_US"
-                ).filtered(
-                    lambda i: i.state == "open"
-                    and i.due_date < this_month
-                    and i.invoice_id.invoice_category != "gift"
-                )
-                contract.due_invoice_ids = invoice_lines.mapped("invoice_id")
-                contract.amount_due = \
-                    int(sum(invoice_lines.mapped("price_subtotal")))
-                months = set()
-                for invoice in invoice_lines.mapped("invoice_id"):
-                    idate = invoice.date
-                    months.add((idate.month, idate.year))
-                contract.months_due = len(months)
+                invoice_ids, amount, months = due_data.get(
+                    contract.id, ([], 0, 0))
+                contract.due_invoice_ids = [(6, 0, invoice_ids)]
+                contract.amount_due = int(amount or 0)
+                contract.months_due = months
             else:
                 contract.months_due = 0
 
@@ -191,6 +205,31 @@ class RecurringContract(models.Model):
         self._compute_due_invoices()
         return True
 
+    @api.model
+    def recompute_due_invoices(self, domain=None, batch_size=1000):
+        """
+        Recomputes the stored due invoices fields, which depend on the
+        current month. Can be used for backfilling the values.
+        :param domain: restrict the contracts to recompute
+        :param batch_size: number of contracts recomputed at once
+        :return: True
+        """
+        contract_ids = self.search(domain or []).ids
+        fields_to_compute = [
+            self._fields[fname] for fname in ("due_invoice_ids", "months_due")
+        ]
+        for i in range(0, len(contract_ids), batch_size):
+            contracts = self.browse(contract_ids[i:i + batch_size])
+            for field in fields_to_compute:
+                self.env.add_todo(field, contracts)
+            contracts.recompute()
+            logger.info(
+                "Due invoices recomputed for %s/%s contracts",
+                min(i + batch_size, len(contract_ids)),
+                len(contract_ids),
+            )
+        return True
+
     ##########################################################################
     #                             PUBLIC METHODS                             #
     ##########################################################################
@@ -283,40 +322,31 @@ class RecurringContract(models.Model):
 
         sponsorships_to_avoid = sponsorships_with_birthday_tomorrow.filtered(lambda s: s.type == "SWP")
 
-        for sponsorship in sponsorships_with_birthday_tomorrow:
-            sponsorship_correspondences = \
-                self.env["correspondence"].search_count(
-                    [
-                        ("sponsorship_id", "=", sponsorship.id),
-                        ("direction", "=", "Supporter To Beneficiary"),
-                        (
-                            "scanned_date",
-                            ">=",
-                            fields.Date.to_string(
-                                datetime.now() - relativedelta(months=2)),
-                        ),
-                    ]
-                )
-
-            if sponsorship_correspondences:
-                sponsorships_to_avoid += sponsorship
-                continue
-
-            sponsorship_gifts = self.env["sponsorship.gift"].search(
-                [
-                    ("sponsorship_id", "=", sponsorship.id),
-                    (
-                        "gift_date",
-                        ">=",
-                        fields.Date.to_string(
-                            datetime.now() - relativedelta(months=2)),
-                    ),
-                    ("sponsorship_gift_type", "=", "Birthday"),
-                ]
-            )
-
-            if sponsorship_gifts:
-                sponsorships_to_avoid += sponsorship
+        # Avoid sponsors that recently wrote or sent a birthday gift
+        two_months_ago = fields.Date.to_string(
+            datetime.now() - relativedelta(months=2))
+        candidates = sponsorships_with_birthday_tomorrow - sponsorships_to_avoid
+        recent_letters = self.env["correspondence"].read_group(
+            [
+                ("sponsorship_id", "in", candidates.ids),
+                ("direction", "=", "Supporter To Beneficiary"),
+                ("scanned_date", ">=", two_months_ago),
+            ],
+            ["sponsorship_id"],
+            ["sponsorship_id"],
+        )
+        recent_gifts = self.env["sponsorship.gift"].read_group(
+            [
+                ("sponsorship_id", "in", candidates.ids),
+                ("gift_date", ">=", two_months_ago),
+                ("sponsorship_gift_type", "=", "Birthday"),
+            ],
+            ["sponsorship_id"],
+            ["sponsorship_id"],
+        )
+        sponsorships_to_avoid += self.browse(list(
+            {group["sponsorship_id"][0] for group in recent_letters + recent_gifts}
+        ))
 
         self._send_birthday_reminders(
             sponsorships_with_birthday_tomorrow - sponsorships_to_avoid,
@@ -347,7 +377,7 @@ class RecurringContract(models.Model):
             "partner_compassion.res_partner_category_corresp_compass"
         return self.search(
             [
-                ("child_id.birthdate", "like", birth_day.strftime("%%-%m-%d")),
+                ("child_id.birthday_month_day", "=", birth_day.strftime("%m-%d")),
                 "|",
                 ("correspondent_id.birthday_reminder", "=", True),
                 ("partner_id.birthday_reminder", "=", True),
@@ -394,7 +424,6 @@ class RecurringContract(models.Model):
             default_print_header=True,
         )
         twenty_ago = today - relativedelta(days=20)
-        comm_obj = self.env["partner.communication.job"]
         search_domain = [
             ("state", "in", ("active", "mandate")),
             ("global_id", "!=", False),
@@ -403,47 +432,73 @@ class RecurringContract(models.Model):
             ("child_id.project_id.suspension", "!=", "fund-suspended"),
             ("child_id.project_id.suspension", "=", False),
         ]
+        # Due months are relative to the current month
+        self.recompute_due_invoices(search_domain)
+        sponsorships = self.search(search_domain + [("months_due", ">", 1)])
+        reminder_dates = sponsorships._get_reminder_dates(
+            first_reminder_config + second_reminder_config, twenty_ago)
 
-        for sponsorship in self.search(
-                search_domain + [("months_due", ">", 1)]):
-            reminder_search = [
-                (
-                    "config_id",
-                    "in",
-                    [first_reminder_config.id, second_reminder_config.id],
-                ),
-                ("state", "=", "done"),
-                ("object_ids", "like", str(sponsorship.id)),
-            ]
+        for sponsorship in sponsorships:
+            last_reminder, recent_reminder = reminder_dates.get(
+                sponsorship.id, (None, False))
             # Look if first reminder was sent previous month (send second
             # reminder in that case)
             # avoid taking into account reminder that the partner already took care of
             # we substract month due to the first of the month to get the older threshold
             # this also prevent reminder_1 to be sent after an already sent reminder_2
-            older_threshold = first_day_of_month - relativedelta(months=sponsorship.months_due)
-
-            has_first_reminder = comm_obj.search_count(
-                reminder_search
-                + [("sent_date", ">=", older_threshold),
-                   ("sent_date", "<", twenty_ago)]
+            older_threshold = datetime.combine(
+                first_day_of_month - relativedelta(months=sponsorship.months_due),
+                datetime.min.time()
             )
-            if has_first_reminder:
+            if last_reminder and last_reminder >= older_threshold:
                 second_reminder += sponsorship
-            else:
+            elif not recent_reminder:
                 # Send first reminder only if one was not already sent less
                 # than twenty days ago
-                has_first_reminder = comm_obj.search_count(
-                    reminder_search + [("sent_date", ">=", twenty_ago)]
-                )
-                if not has_first_reminder:
-                    first_reminder += sponsorship
+                first_reminder += sponsorship
         first_reminder.send_communication(
             first_reminder_config, correspondent=False)
         second_reminder.send_communication(
             second_reminder_config, correspondent=False)
-        logger.info("Sponsorship Reminders created!")
+        logger.info(
+            "Sponsorship Reminders created in %.2f seconds: %s sponsorships "
+            "checked, %s first reminders, %s second reminders",
+            (datetime.now() - today).total_seconds(),
+            len(sponsorships),
+            len(first_reminder),
+            len(second_reminder),
+        )
         return True
 
+    def _get_reminder_dates(self, configs, recent_date):
+        """
+        Finds the reminders sent for the sponsorships in one grouped query.
+        :param configs: partner.communication.config of the reminders
+        :param recent_date: datetime after which a reminder is considered recent
+        :return: dict {sponsorship_id: (last sent date before recent_date,
+                                        True if a reminder is more recent)}
+        """
+        res = {}
+        for sponsorship_ids in self.env.cr.split_for_in_conditions(self.ids):
+            self.env.cr.execute(
+                """
+                SELECT o.res_id,
+                    max(j.sent_date) FILTER (WHERE j.sent_date < %s),
+                    bool_or(j.sent_date >= %s)
+                FROM partner_communication_object o
+                JOIN partner_communication_job j ON j.id = o.job_id
+                WHERE o.res_model = %s AND o.res_id IN %s
+                AND j.config_id IN %s AND j.state = 'done'
+                GROUP BY o.res_id
+            """,
+                [recent_date, recent_date, self._name, sponsorship_ids,
+                 tuple(configs.ids)],
+            )
+            res.update(
+                (row[0], (row[1], bool(row[2]))) for row in self.env.cr.fetchall()
+            )
+        return res
+
     def get_bvr_gift_attachment(self, products, background=False):
         """
         Get a BVR communication attachment for given gift products.
@@ -592,11 +647,10 @@ class RecurringContract(models.Model):
     def contract_cancelled(self):
         # Remove pending communications
         for contract in self:
-            self.env["partner.communication.job"].search([
+            self.env["partner.communication.job"].search_for_objects(contract, [
                 ("config_id.model_id.model", "=", self._name),
                 "|", ("partner_id", "=", contract.partner_id.id),
                 ("partner_id", "=", contract.correspondent_id.id),
-                ("object_ids", "like", contract.id),
                 ("state", "=", "pending")
             ]).unlink()
         super().contract_cancelled()
@@ -609,11 +663,10 @@ class RecurringContract(models.Model):
         cancel_config = self.env.ref(
             "partner_communication_switzerland.sponsorship_cancellation")
         for contract in self:
-            self.env["partner.communication.job"].search([
+            self.env["partner.communication.job"].search_for_objects(contract, [
                 ("config_id", "=", cancel_config.id),
                 "|", ("partner_id", "=", contract.partner_id.id),
                 ("partner_id", "=", contract.correspondent_id.id),
-                ("object_ids", "like", contract.id),
                 ("state", "=", "pending")
             ]).unlink()
         return True
@@ -655,12 +708,11 @@ class RecurringContract(models.Model):
         one_month_ago = fields.Date.today() - relativedelta(months=1)
         for wrpr in wrprs.filtered(lambda w: not w.last_paid_invoice_date
                                    and w.invoice_line_ids[:1].due_date < one_month_ago):
-            already_reminded = comms.search_count([
+            already_reminded = comms.search_for_objects(wrpr, [
                 ("config_id", "=", contribution_reminder.id),
                 ("partner_id", "=", wrpr.partner_id.id),
-                ("object_ids", "like", wrpr.id),
                 ("state", "=", "done")
-            ])
+            ], count=True)
             job = wrpr.send_communication(contribution_reminder, correspondent=False)
             if already_reminded:
                 sub_reminders += job
@@ -798,11 +850,11 @@ class RecurringContract(models.Model):
         else:
             configs = new_dossier + child_picture
         for config in configs:
-            already_sent = self.env["partner.communication.job"].search(
+            already_sent = self.env["partner.communication.job"].search_for_objects(
+                self,
                 [
                     ("partner_id", "=", partner.id),
                     ("config_id", "=", config.id),
-                    ("object_ids", "like", str(self.id)),
                     ("state", "=", "done"),
                 ]
             )
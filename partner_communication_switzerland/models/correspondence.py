@@ -8,7 +8,11 @@
 #
 ##############################################################################
 import base64
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
 
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
@@ -23,6 +27,12 @@ from functools import reduce
 
 _logger = logging.getLogger(__name__)
 
+# Detected languages of letter texts {(db, text hash): (model, lang id)},
+# least recently used first
+LANGUAGE_CACHE = OrderedDict()
+LANGUAGE_CACHE_LOCK = threading.Lock()
+LANGUAGE_CACHE_SIZE = 10000
+
 
 class Correspondence(models.Model):
     _inherit = "correspondence"
@@ -51,8 +61,8 @@ class Correspondence(models.Model):
         store=True,
         track_visibility="onchange",
     )
-    email_read = fields.Datetime(
-        compute="_compute_email_read", inverse="_inverse_email_read", store=True)
+    # Updated by the mail.tracking.event creation (see _update_email_read)
+    email_read = fields.Datetime()
     zip_file = fields.Binary(oldname="zip_id", attachment=True)
     has_valid_language = fields.Boolean(compute="_compute_valid_language", store=True)
 
@@ -77,6 +87,7 @@ class Correspondence(models.Model):
     def _compute_valid_language(self):
         """ Detect if text is written in the language corresponding to the
         language_id """
+        texts = {}
         for letter in self:
             letter.has_valid_language = False
             if letter.translated_text and letter.translation_language_id:
@@ -86,26 +97,25 @@ class Correspondence(models.Model):
                     .replace(PAGE_SEPARATOR, "")
                 )
                 if s:
-                    # find the language of text argument
-                    lang = self.env["langdetect"].detect_language(letter.translated_text)
-                    letter.has_valid_language = (
-                        lang and lang in letter.supporter_languages_ids
-                    )
+                    texts[letter] = letter.translated_text
+        # find the language of all texts at once
+        languages = self._detect_languages(list(texts.values()))
+        for letter, text in texts.items():
+            lang = languages[text]
+            letter.has_valid_language = bool(
+                lang and lang in letter.supporter_languages_ids)
 
+    ##########################################################################
+    #                              ORM METHODS                               #
+    ##########################################################################
     @api.multi
-    @api.depends("communication_id.email_id.mail_tracking_ids.tracking_event_ids")
-    def _compute_email_read(self):
-        for mail in self:
-            dates = [
-                x.time
-                for x in mail.communication_id.email_id.tracking_event_ids
-                if x.event_type in ("open", "delivered")
-            ]
-            if dates:
-                mail.email_read = max(dates)
-
-    def _inverse_email_read(self):
-        return True
+    def write(self, vals):
+        if "communication_id" in vals and "email_read" not in vals:
+            vals["email_read"] = False
+            res = super().write(vals)
+            self._update_email_read(self.mapped("email_id").ids)
+            return res
+        return super().write(vals)
 
     ##########################################################################
     #                             PUBLIC METHODS                             #
@@ -204,6 +214,17 @@ class Correspondence(models.Model):
 
         return True
 
+    @api.model
+    def backfill_email_read(self):
+        """
+        Recomputes the read date of all letters from the mail tracking events.
+        Can be run from a shell after importing tracking events in bulk.
+        :return: True
+        """
+        count = self._update_email_read()
+        _logger.info("Updated read date of %s letters", count)
+        return True
+
     @api.multi
     def send_unread_b2s(self):
         """
@@ -214,20 +235,110 @@ class Correspondence(models.Model):
         unread_config = self.env.ref(
             "partner_communication_switzerland.child_letter_unread"
         )
-        for letter in self:
-            if letter.communication_id.filter_not_read():
-                self.env["partner.communication.job"].create(
-                    {
-                        "partner_id": letter.partner_id.id,
-                        "config_id": unread_config.id,
-                        "object_ids": letter.id,
-                    }
-                )
+        # Read status of all communications is fetched at once
+        status = self.mapped("communication_id").get_delivery_status()
+        unread_letters = self.filtered(
+            lambda letter: letter.communication_id
+            and status[letter.communication_id.id] in ("failed", "missing")
+        )
+        # One communication per partner containing all its unread letters
+        letters_by_partner = {}
+        for letter in unread_letters:
+            letters_by_partner.setdefault(letter.partner_id.id, []).append(letter.id)
+        self.env["partner.communication.job"].create([
+            {
+                "partner_id": partner_id,
+                "config_id": unread_config.id,
+                "object_ids": letter_ids,
+            }
+            for partner_id, letter_ids in letters_by_partner.items()
+        ])
+        _logger.info(
+            "%s unread letters will be printed for %s partners",
+            len(unread_letters), len(letters_by_partner)
+        )
         return True
 
     ##########################################################################
     #                             PRIVATE METHODS                            #
     ##########################################################################
+    @api.model
+    def _detect_languages(self, texts):
+        """
+        Detects the language of several texts. Identical texts are detected
+        only once, and the results are cached by text hash, as the same
+        letters are often checked again when their pages change.
+        :param texts: list of texts
+        :return: dict {text: detected language record or False}
+        """
+        start = time.time()
+        langdetect = self.env["langdetect"]
+        res = {}
+        hits = 0
+        for text in set(texts):
+            key = (self.env.cr.dbname, hashlib.sha1(text.encode("utf-8")).hexdigest())
+            with LANGUAGE_CACHE_LOCK:
+                cached = LANGUAGE_CACHE.get(key)
+                if cached is not None:
+                    LANGUAGE_CACHE.move_to_end(key)
+            if cached is not None:
+                hits += 1
+                model, lang_id = cached
+                res[text] = model and self.env[model].browse(lang_id)
+            else:
+                lang = langdetect.detect_language(text)
+                res[text] = lang
+                with LANGUAGE_CACHE_LOCK:
+                    LANGUAGE_CACHE[key] = (
+                        (lang._name, lang.id) if lang else (False, False)
+                    )
+                    while len(LANGUAGE_CACHE) > LANGUAGE_CACHE_SIZE:
+                        LANGUAGE_CACHE.popitem(last=False)
+        duration = time.time() - start
+        if len(texts) > 1:
+            _logger.info(
+                "Language detection of %s texts (%s distinct, %s cached) "
+                "in %.2f seconds (%.1f texts per second)",
+                len(texts), len(res), hits, duration,
+                len(texts) / duration if duration else len(texts),
+            )
+        return res
+
+    @api.model
+    def _update_email_read(self, mail_ids=None):
+        """
+        Sets the read date of the letters from the open and delivered
+        tracking events of their e-mail, with one query.
+        :param mail_ids: mail.mail ids to update. All letters are updated if
+                         not given, which can be used to backfill the dates.
+        :return: number of updated letters
+        """
+        if mail_ids is not None and not mail_ids:
+            return 0
+        query = """
+            UPDATE correspondence c SET email_read = e.read_date
+            FROM (
+                SELECT t.mail_id, max(ev.time) AS read_date
+                FROM mail_tracking_email t
+                JOIN mail_tracking_event ev ON ev.tracking_email_id = t.id
+                WHERE ev.event_type IN ('open', 'delivered')
+                {}
+                GROUP BY t.mail_id
+            ) e
+            WHERE c.email_id = e.mail_id
+            AND (c.email_read IS NULL OR c.email_read < e.read_date)
+        """
+        count = 0
+        if mail_ids is None:
+            self.env.cr.execute(query.format("AND t.mail_id IS NOT NULL"))
+            count = self.env.cr.rowcount
+        else:
+            for ids in self.env.cr.split_for_in_conditions(mail_ids):
+                self.env.cr.execute(query.format("AND t.mail_id IN %s"), [ids])
+                count += self.env.cr.rowcount
+        self.invalidate_cache(["email_read"])
+        return count
+
     def _generate_communication(self, config):
         """
         Generates the communication for given letters.
@@ -17,6 +17,17 @@ _logger = logging.getLogger(__name__)
 class MailTrackingEvent(models.Model):
     _inherit = "mail.tracking.event"
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        events = super().create(vals_list)
+        # Letters store the read date of their e-mail
+        read_events = events.filtered(lambda e: e.event_type in ("open", "delivered"))
+        if read_events:
+            self.env["correspondence"].sudo()._update_email_read(
+                read_events.mapped("tracking_email_id.mail_id").ids
+            )
+        return events
+
     def send_mails_to_partner_and_staff(
             self, tracking_email, metadata, staff_email_body
     ):
@@ -14,10 +14,11 @@ import re
 
 import requests
 
+from ..tools.pdf_batch import PdfRenderBatch
 from ..wizards.generate_communication_wizard import SMS_CHAR_LIMIT, SMS_COST
 from math import ceil
 from collections import OrderedDict
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from io import BytesIO
 
 from dateutil.relativedelta import relativedelta
@@ -28,6 +29,10 @@ from odoo.exceptions import MissingError, UserError
 
 _logger = logging.getLogger(__name__)
 
+LSV_DD_FORM_URL = "https://compassion.ch/wp-content/uploads/documents_compassion/"
+LSV_DD_FORM_TTL = timedelta(days=1)
+LSV_DD_FORM_TIMEOUT = 10
+
 try:
     from PyPDF2 import PdfFileWriter, PdfFileReader
     from bs4 import BeautifulSoup
@@ -51,6 +56,74 @@ class PartnerCommunication(models.Model):
         default=lambda self: self.env.ref("sms_939.large_account_id", False),
         readonly=False,
     )
+    object_link_ids = fields.One2many(
+        "partner.communication.object", "job_id", "Related objects", readonly=True
+    )
+
+    @api.model
+    def create(self, vals):
+        job = super().create(vals)
+        job._update_object_links()
+        return job
+
+    @api.multi
+    def write(self, vals):
+        res = super().write(vals)
+        if "object_ids" in vals or "config_id" in vals:
+            self._update_object_links()
+        return res
+
+    def _update_object_links(self):
+        """ Synchronizes the related objects table with object_ids field. """
+        if not self:
+            return
+        self.env.cr.execute(
+            "DELETE FROM partner_communication_object WHERE job_id IN %s",
+            [tuple(self.ids)],
+        )
+        values = []
+        for job in self.filtered("object_ids"):
+            res_ids = {
+                int(res_id)
+                for res_id in job.object_ids.split(",")
+                if res_id.strip().isdigit()
+            }
+            values.extend((job.id, job.model, res_id) for res_id in res_ids)
+        for vals in (values[i:i + 1000] for i in range(0, len(values), 1000)):
+            self.env.cr.execute(
+                "INSERT INTO partner_communication_object (job_id, res_model, res_id) "
+                "VALUES " + ",".join(["%s"] * len(vals)),
+                vals,
+            )
+        self.invalidate_cache(["object_link_ids"])
+
+    @api.model
+    def search_for_objects(self, records, domain=None, **kwargs):
+        """
+        Exact and indexed replacement for a search on
+        ("object_ids", "like", record.id).
+        :param records: recordset of the objects linked to the communications
+        :param domain: additional search domain
+        :param kwargs: any other search arguments (limit, order, count)
+        :return: partner.communication.job recordset (or count)
+        """
+        job_ids = self.env["partner.communication.object"].get_job_ids(records)
+        all_ids = list({job_id for ids in job_ids.values() for job_id in ids})
+        return self.search([("id", "in", all_ids)] + (domain or []), **kwargs)
+
+    @api.model
+    def search_per_object(self, records, domain=None):
+        """
+        Same as search_for_objects, grouped by object.
+        :return: dict {record_id: partner.communication.job recordset}
+        """
+        job_ids = self.env["partner.communication.object"].get_job_ids(records)
+        all_ids = list({job_id for ids in job_ids.values() for job_id in ids})
+        jobs = self.search([("id", "in", all_ids)] + (domain or []))
+        return {
+            res_id: jobs.filtered(lambda j, ids=set(ids): j.id in ids)
+            for res_id, ids in job_ids.items()
+        }
 
     def schedule_call(self):
         self.ensure_one()
@@ -86,36 +159,87 @@ class PartnerCommunication(models.Model):
         for wizard in self:
             wizard.currency_id = chf.id
 
+    @api.multi
+    def get_delivery_status(self):
+        """
+        Computes the delivery status of the communications with a single
+        query on the mail tracking tables.
+        Possible statuses are:
+        - failed: the e-mail could not be delivered
+        - opened: the e-mail was opened or a link was clicked
+        - sent: the e-mail was sent with no failure nor opening event
+        - missing: the communication is done digitally, but has no e-mail
+        - none: no e-mail is involved (printed or not yet sent)
+        :return: dict {communication_id: status}
+        """
+        status = {}
+        email_jobs = {}
+        for communication in self:
+            if communication.email_id:
+                email_jobs.setdefault(communication.email_id.id, []).append(
+                    communication.id
+                )
+                status[communication.id] = "sent"
+            elif communication.state == "done" and communication.send_mode == "digital":
+                status[communication.id] = "missing"
+            else:
+                status[communication.id] = "none"
+        # Use a query to improve performance
+        query_sql = """
+            SELECT m.id,
+                bool_or(
+                    m.state IN ('exception', 'cancel')
+                    OR tevent.event_type IN (
+                        'hard_bounce', 'soft_bounce', 'spam', 'reject')
+                    OR tmail.state IN (
+                        'error', 'rejected', 'spam', 'bounced', 'soft-bounced')
+                ) AS failed,
+                bool_or(
+                    tevent.event_type IN ('open', 'click')
+                    OR tmail.state = 'opened'
+                ) AS opened
+            FROM mail_mail m
+            LEFT JOIN mail_tracking_email tmail ON tmail.mail_id = m.id
+            LEFT JOIN mail_tracking_event tevent ON tevent.tracking_email_id = tmail.id
+            WHERE m.id IN %s
+            GROUP BY m.id
+        """
+        for email_ids in self.env.cr.split_for_in_conditions(list(email_jobs)):
+            self.env.cr.execute(query_sql, [email_ids])
+            for email_id, failed, opened in self.env.cr.fetchall():
+                mail_status = "failed" if failed else "opened" if opened else "sent"
+                for communication_id in email_jobs[email_id]:
+                    status[communication_id] = mail_status
+        return status
+
+    @api.multi
     def filter_not_read(self):
         """
         Useful for checking if the communication was read by the sponsor.
         Printed letters are always treated as read.
         Returns only the communications that are not read.
         """
-        not_read = self.env[self._name]
-        # Use a query to improve performance
-        query_sql = """
-            SELECT DISTINCT m.id
-            FROM mail_mail m 
-            FULL JOIN mail_tracking_email tmail ON tmail.mail_id = m.id
-            FULL JOIN mail_tracking_event tevent ON tevent.tracking_email_id = tmail.id
-            WHERE m.id = %s
-            AND (
-                m.state IN ('exception', 'cancel')
-                OR tevent.event_type IN (
-                    'hard_bounce', 'soft_bounce', 'spam', 'reject')
-                OR tmail.state IN (
-                    'error', 'rejected', 'spam', 'bounced', 'soft-bounced')
-            )
+        status = self.get_delivery_status()
+        return self.filtered(lambda c: status[c.id] in ("failed", "missing"))
+
+    @api.multi
+    def set_attachments(self):
         """
-        for communication in self:
-            if communication.email_id:
-                self.env.cr.execute(query_sql, [communication.email_id.id])
-                if self.env.cr.rowcount:
-                    not_read += communication
-            elif communication.state == "done" and communication.send_mode == "digital":
-                not_read += communication
-        return not_read
+        Renders the attachments of several communications together: the
+        reports are collected during the generation of the attachments and
+        rendered at once in a PdfRenderBatch, which avoids rendering
+        the same reports over and over and runs wkhtmltopdf in parallel.
+        The rendered PDFs are then written on the attachments bound to
+        the batch when they were created.
+        """
+        if len(self) < 2 or "pdf_batch" in self.env.context:
+            return super().set_attachments()
+        pdf_batch = PdfRenderBatch()
+        res = super(PartnerCommunication, self.with_context(
+            pdf_batch=pdf_batch)).set_attachments()
+        if pdf_batch:
+            pdf_batch.render()
+        return res
 
     def get_correspondence_attachments(self, letters=None):
         """
@@ -279,17 +403,10 @@ class PartnerCommunication(models.Model):
         ):
             if not self.partner_id.bank_ids or not self.partner_id.valid_mandate_id:
                 # Don't put payment slip if we just wait the authorization form
-                lang = self.env.lang[:2].upper() if self.env.lang != "en_US" else "DE"
-                pdf_form = base64.b64encode(
-                    requests.get(
-                        f"https://compassion.ch/wp-content/uploads/documents_compassion/"
-                        f"Formulaire_LSV_DD_{lang}.pdf"
-                    ).content
-                )
                 return {
                     _("bank authorization form.pdf"): [
                         "partner_communication.a4_no_margin",
-                        pdf_form,
+                        self._get_lsv_dd_form(),
                     ]
                 }
 
@@ -852,23 +969,77 @@ class PartnerCommunication(models.Model):
             lambda s: s.payment_mode_id in lsv_dd_modes
         )
         if lsv_dd_sponsorships and not self.partner_id.valid_mandate_id:
-            lang = self.env.lang[:2].upper() if self.env.lang != "en_US" else "DE"
-            pdf_form = base64.b64encode(
-                requests.get(
-                    f"https://compassion.ch/wp-content/uploads/documents_compassion/"
-                    f"Formulaire_LSV_DD_{lang}.pdf"
-                ).content
-            )
             attachments.update(
                 {
                     _("bank authorization form.pdf"): [
                         "partner_communication.a4_no_margin",
-                        pdf_form,
+                        self._get_lsv_dd_form(),
                     ]
                 }
             )
         return attachments
 
+    @api.model
+    def _get_lsv_dd_form(self):
+        """
+        Gets the LSV/DD bank authorization form in the language of the context.
+        The form is cached in an attachment and only revalidated against the
+        website (using the ETag) when the cached copy is older than
+        LSV_DD_FORM_TTL. If the website cannot be reached, the cached copy
+        is used.
+        :return: base64 encoded PDF
+        """
+        lang = self.env.lang[:2].upper() if self.env.lang != "en_US" else "DE"
+        name = f"Formulaire_LSV_DD_{lang}.pdf"
+        attachment_obj = self.env["ir.attachment"].sudo()
+        cached = attachment_obj.search(
+            [("res_model", "=", self._name), ("res_id", "=", 0), ("name", "=", name)],
+            order="write_date desc",
+            limit=1,
+        )
+        if cached and cached.write_date > datetime.now() - LSV_DD_FORM_TTL:
+            return cached.datas
+
+        headers = {}
+        if cached.description:
+            headers["If-None-Match"] = cached.description
+        try:
+            response = requests.get(
+                LSV_DD_FORM_URL + name, headers=headers, timeout=LSV_DD_FORM_TIMEOUT
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            if not cached:
+                raise UserError(
+                    _("The bank authorization form %s could not be downloaded.")
+                    % name
+                )
+            _logger.warning(
+                "Unable to revalidate %s, using cached version", name, exc_info=True
+            )
+            return cached.datas
+
+        etag = response.headers.get("ETag")
+        if response.status_code == 304:
+            # Touch the attachment to restart the TTL
+            cached.write({"description": etag or cached.description})
+            return cached.datas
+        vals = {"datas": base64.b64encode(response.content), "description": etag}
+        if cached:
+            cached.write(vals)
+        else:
+            vals.update(
+                {
+                    "name": name,
+                    "datas_fname": name,
+                    "res_model": self._name,
+                    "res_id": 0,
+                    "mimetype": "application/pdf",
+                }
+            )
+            cached = attachment_obj.create(vals)
+        return cached.datas
+
     def get_csp_picture(self):
         self.ensure_one()
         field_offices = set(
@@ -990,19 +1161,24 @@ class PartnerCommunication(models.Model):
     def _get_pdf_from_data(self, data, report_ref):
         """
         Helper to get the PDF base64 encoded given report ref and its data.
+        When a PDF batch is given in the context, the rendering is deferred
+        and a placeholder is returned instead (see set_attachments).
         :param data: values for the report generation
         :param report_ref: report xml id
         :return: base64 encoded PDF
         """
+        pdf_batch = self.env.context.get("pdf_batch")
+        if pdf_batch is not None and pdf_batch.can_batch(report_ref):
+            return pdf_batch.add(report_ref, data)
+
         report_str = report_ref.render_qweb_pdf(data.get("doc_ids"), data)
         if isinstance(report_str, (list, tuple)):
             report_str = report_str[0]
         elif isinstance(report_str, bool):
             report_str = ""
 
-        output = None
         if isinstance(report_str, bytes):
             output = base64.encodebytes(report_str)
         else:
-            base64.encodebytes(report_str.encode())
+            output = base64.encodebytes(report_str.encode())
         return output
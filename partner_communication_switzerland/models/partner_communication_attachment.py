@@ -0,0 +1,26 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from odoo import api, models
+
+
+class PartnerCommunicationAttachment(models.Model):
+    _inherit = "partner.communication.attachment"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Attachments created during a PDF batch are registered in the batch,
+        which will write the rendered PDF on them (see set_attachments).
+        """
+        attachments = super().create(vals_list)
+        pdf_batch = self.env.context.get("pdf_batch")
+        if pdf_batch is not None:
+            pdf_batch.bind(attachments)
+        return attachments
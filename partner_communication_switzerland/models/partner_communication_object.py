@@ -0,0 +1,60 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from odoo import api, models, fields
+from odoo.tools import create_index
+
+
+class PartnerCommunicationObject(models.Model):
+    """
+    Normalized relation between communications and the records stored in
+    their object_ids field, allowing exact and indexed lookups of the
+    communications sent for a given record.
+    """
+
+    _name = "partner.communication.object"
+    _description = "Communication related object"
+    _log_access = False
+
+    job_id = fields.Many2one(
+        "partner.communication.job", "Communication",
+        required=True, ondelete="cascade", index=True
+    )
+    res_model = fields.Char(required=True)
+    res_id = fields.Integer(required=True)
+
+    @api.model_cr
+    def init(self):
+        create_index(
+            self.env.cr,
+            "partner_communication_object_res_model_res_id_index",
+            self._table,
+            ["res_model", "res_id"],
+        )
+
+    @api.model
+    def get_job_ids(self, records):
+        """
+        Finds the communications linked to given records.
+        :param records: any recordset
+        :return: dict {record_id: [communication ids]}
+        """
+        res = {}
+        for record_ids in self.env.cr.split_for_in_conditions(records.ids):
+            self.env.cr.execute(
+                """
+                SELECT res_id, array_agg(job_id)
+                FROM partner_communication_object
+                WHERE res_model = %s AND res_id IN %s
+                GROUP BY res_id
+            """,
+                [records._name, record_ids],
+            )
+            res.update(self.env.cr.fetchall())
+        return res
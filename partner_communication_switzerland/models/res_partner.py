@@ -256,66 +256,11 @@ class ResPartner(models.Model):
     def generate_tax_receipts(self):
         """
         Generate all tax receipts of last year.
-        Called once a year to prepare all communications
-        :return: recordset of partner.communication.job
+        Called once a year to prepare all communications. The generation
+        is split in queue jobs and resumed if it was interrupted.
+        :return: partner.tax.receipt.run record
         """
-        # Select partners that made donations last year
-        today = date.today()
-        start_date = today.replace(today.year - 1, 1, 1)
-        end_date = today.replace(today.year - 1, 12, 31)
-        invoice_lines = self.env["account.invoice.line"].search(
-            [
-                ("last_payment", ">=", start_date),
-                ("last_payment", "<=", end_date),
-                ("state", "=", "paid"),
-                ("product_id.requires_thankyou", "=", True),
-                ("partner_id.tax_certificate", "!=", "no"),
-            ]
-        )
-        config = self.env.ref("partner_communication_switzerland.tax_receipt_config")
-        existing_comm = self.env["partner.communication.job"].search(
-            [
-                ("config_id", "=", config.id),
-                ("state", "in", ["pending", "done", "call"]),
-                ("date", ">", end_date),
-            ]
-        )
-        partners = invoice_lines.mapped("partner_id.commercial_partner_id") - existing_comm.mapped(
-            "partner_id"
-        )
-        total = len(partners)
-        count = 1
-        for partner in partners:
-            _logger.info(f"Generating tax receipts: {count}/{total}")
-            comm_vals = {
-                "config_id": config.id,
-                "partner_id": partner.id,
-                "object_ids": partner.id,
-                "user_id": config.user_id.id,
-                "show_signature": True,
-                "print_subject": False,
-            }
-
-            self.env["partner.communication.job"].create(comm_vals)
-            donation_amount = partner.get_receipt(today.year - 1)
-            email_limit = int(
-                self.env["ir.config_parameter"]
-                    .sudo()
-                    .get_param(
-                    "partner_communication_switzerland.tax_receipt_email_limit", "1000"
-                )
-            )
-            if (
-                    partner.tax_certificate != "only_email"
-                    and donation_amount > email_limit
-            ):
-                comm_vals["send_mode"] = "physical"
-            self.env["partner.communication.job"].create(comm_vals)
-            # Commit at each creation of communication to avoid starting all
-            # again in case the job failed
-            self.env.cr.commit()  # pylint: disable=invalid-commit
-            count += 1
-        return True
+        return self.env["partner.tax.receipt.run"].start()
 
     @api.multi
     def sms_send_step1_confirmation(self, child_request):
@@ -0,0 +1,239 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+import time
+from datetime import date
+
+from psycopg2 import OperationalError, errorcodes
+
+from odoo import api, models, fields
+from odoo.addons.queue_job.exception import RetryableJobError
+
+_logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 200
+EMAIL_LIMIT_PARAM = "partner_communication_switzerland.tax_receipt_email_limit"
+
+
+class TaxReceiptRun(models.Model):
+    """
+    Generation of the yearly tax receipts. The donors are split in chunks
+    that are processed by queue jobs. The chunks act as checkpoints: an
+    interrupted run is resumed by processing only the remaining chunks.
+    """
+
+    _name = "partner.tax.receipt.run"
+    _description = "Tax receipts generation"
+    _order = "create_date desc"
+
+    year = fields.Integer(required=True, readonly=True)
+    state = fields.Selection(
+        [("running", "Running"), ("done", "Done")],
+        default="running",
+        readonly=True,
+    )
+    chunk_ids = fields.One2many(
+        "partner.tax.receipt.run.chunk", "run_id", "Chunks", readonly=True
+    )
+    partner_count = fields.Integer(compute="_compute_progress")
+    done_count = fields.Integer(compute="_compute_progress")
+    communication_count = fields.Integer(compute="_compute_progress")
+    progress = fields.Float(compute="_compute_progress")
+    throughput = fields.Float(
+        compute="_compute_progress", help="Processed partners per minute"
+    )
+
+    @api.multi
+    def _compute_progress(self):
+        for run in self:
+            chunks = run.chunk_ids
+            run.partner_count = sum(chunks.mapped("partner_count"))
+            run.done_count = sum(chunks.mapped("done_count"))
+            run.communication_count = sum(chunks.mapped("communication_count"))
+            run.progress = (
+                run.done_count * 100.0 / run.partner_count if run.partner_count else 0
+            )
+            duration = sum(chunks.mapped("duration"))
+            run.throughput = run.done_count * 60.0 / duration if duration else 0
+
+    @api.model
+    def start(self, year=None):
+        """
+        Starts the generation of the tax receipts, or resumes the running
+        generation of the same year.
+        :param year: year of the donations (last year by default)
+        :return: partner.tax.receipt.run record
+        """
+        year = year or date.today().year - 1
+        run = self.search([("year", "=", year), ("state", "=", "running")], limit=1)
+        if run:
+            _logger.info("Resuming tax receipts generation of %s", year)
+            run.chunk_ids.filtered(lambda c: c.state != "done").enqueue()
+            return run
+
+        run = self.create({"year": year})
+        partner_ids = run._get_partners().ids
+        chunk_obj = self.env["partner.tax.receipt.run.chunk"]
+        for i in range(0, len(partner_ids), CHUNK_SIZE):
+            chunk_obj += chunk_obj.create(
+                {
+                    "run_id": run.id,
+                    "partner_ids": [(6, 0, partner_ids[i:i + CHUNK_SIZE])],
+                }
+            )
+        _logger.info(
+            "Generating tax receipts of %s for %s partners in %s chunks",
+            year,
+            len(partner_ids),
+            len(chunk_obj),
+        )
+        chunk_obj.enqueue()
+        return run
+
+    @api.multi
+    def _get_partners(self):
+        """ Select partners that made donations during the year. """
+        self.ensure_one()
+        start_date = date(self.year, 1, 1)
+        end_date = date(self.year, 12, 31)
+        invoice_lines = self.env["account.invoice.line"].search(
+            [
+                ("last_payment", ">=", start_date),
+                ("last_payment", "<=", end_date),
+                ("state", "=", "paid"),
+                ("product_id.requires_thankyou", "=", True),
+                ("partner_id.tax_certificate", "!=", "no"),
+            ]
+        )
+        return invoice_lines.mapped("partner_id.commercial_partner_id")
+
+    @api.multi
+    def check_done(self):
+        """
+        Marks the runs whose chunks are all done. It is called at the end of
+        each chunk job, and two chunks finishing together would each miss the
+        other one in their snapshot. Locking the run rows serializes the
+        jobs (a job finding them locked is retried later) and locking the
+        chunk rows makes a job with a stale snapshot fail with a
+        serialization error, after which it is retried by the job runner.
+        """
+        if not self:
+            return True
+        try:
+            self.env.cr.execute(
+                "SELECT id FROM partner_tax_receipt_run WHERE id IN %s "
+                "FOR UPDATE NOWAIT",
+                [tuple(self.ids)],
+            )
+        except OperationalError as e:
+            if e.pgcode == errorcodes.LOCK_NOT_AVAILABLE:
+                raise RetryableJobError(
+                    "Tax receipt run is being checked by another job", seconds=5
+                )
+            raise
+        self.env.cr.execute(
+            "SELECT id FROM partner_tax_receipt_run_chunk WHERE run_id IN %s "
+            "ORDER BY id FOR UPDATE",
+            [tuple(self.ids)],
+        )
+        for run in self:
+            if all(state == "done" for state in run.chunk_ids.mapped("state")):
+                run.state = "done"
+                _logger.info(
+                    "Tax receipts of %s generated for %s partners "
+                    "(%.1f partners per minute)",
+                    run.year,
+                    run.done_count,
+                    run.throughput,
+                )
+        return True
+
+
+class TaxReceiptRunChunk(models.Model):
+    _name = "partner.tax.receipt.run.chunk"
+    _description = "Tax receipts generation chunk"
+
+    run_id = fields.Many2one(
+        "partner.tax.receipt.run", required=True, ondelete="cascade", index=True
+    )
+    partner_ids = fields.Many2many("res.partner", string="Partners", readonly=True)
+    partner_count = fields.Integer(compute="_compute_partner_count")
+    state = fields.Selection(
+        [("pending", "Pending"), ("done", "Done")], default="pending", index=True
+    )
+    done_count = fields.Integer(readonly=True)
+    communication_count = fields.Integer(readonly=True)
+    duration = fields.Float(readonly=True, help="Processing time in seconds")
+
+    @api.multi
+    def _compute_partner_count(self):
+        for chunk in self:
+            chunk.partner_count = len(chunk.partner_ids)
+
+    @api.multi
+    def enqueue(self):
+        for chunk in self:
+            chunk.with_delay().generate_tax_receipts()
+        return True
+
+    @api.multi
+    def generate_tax_receipts(self):
+        """
+        Creates the tax receipts communications of the chunk partners.
+        Partners already having a tax receipt are skipped, which makes it
+        safe to run a chunk again.
+        """
+        self.ensure_one()
+        if self.state == "done":
+            return True
+        start = time.time()
+        run = self.run_id
+        config = self.env.ref("partner_communication_switzerland.tax_receipt_config")
+        comm_obj = self.env["partner.communication.job"].with_context(year=run.year)
+        existing = comm_obj.search(
+            [
+                ("config_id", "=", config.id),
+                ("state", "in", ["pending", "done", "call"]),
+                ("date", ">", date(run.year, 12, 31)),
+                ("partner_id", "in", self.partner_ids.ids),
+            ]
+        ).mapped("partner_id")
+        partners = self.partner_ids - existing
+        amounts = partners.get_receipts(run.year)
+        email_limit = int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param(EMAIL_LIMIT_PARAM, "1000")
+        )
+        for partner in partners:
+            comm_vals = {
+                "config_id": config.id,
+                "partner_id": partner.id,
+                "object_ids": partner.id,
+                "user_id": config.user_id.id,
+                "show_signature": True,
+                "print_subject": False,
+            }
+            if (
+                    partner.tax_certificate != "only_email"
+                    and amounts[partner.id] > email_limit
+            ):
+                comm_vals["send_mode"] = "physical"
+            comm_obj.create(comm_vals)
+        self.write(
+            {
+                "state": "done",
+                "done_count": len(self.partner_ids),
+                "communication_count": len(partners),
+                "duration": time.time() - start,
+            }
+        )
+        run.check_done()
+        return True
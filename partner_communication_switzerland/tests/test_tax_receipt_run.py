@@ -0,0 +1,136 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+
+import mock
+
+from odoo.tests.common import TransactionCase
+
+mock_chunk_size = (
+    "odoo.addons.partner_communication_switzerland.models.tax_receipt_run"
+    ".CHUNK_SIZE"
+)
+mock_get_partners = (
+    "odoo.addons.partner_communication_switzerland.models.tax_receipt_run"
+    ".TaxReceiptRun._get_partners"
+)
+mock_run_wkhtmltopdf = (
+    "odoo.addons.partner_communication_switzerland.tools.pdf_batch"
+    "._run_wkhtmltopdf"
+)
+mock_get_receipts = (
+    "odoo.addons.report_compassion.models.res_partner.ResPartner.get_receipts"
+)
+
+
+class TestTaxReceiptRun(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        self.partners = self.env["res.partner"]
+        for i in range(5):
+            self.partners += self.env["res.partner"].create(
+                {
+                    "firstname": "Donor",
+                    "lastname": "Tax receipt %s" % i,
+                    "email": "donor%s@example.com" % i,
+                    "tax_certificate": "default",
+                }
+            )
+        self.config = self.env.ref(
+            "partner_communication_switzerland.tax_receipt_config"
+        )
+
+    def _start(self, year=2021):
+        with mock.patch(mock_chunk_size, 2), mock.patch(
+            mock_get_partners
+        ) as get_partners:
+            get_partners.return_value = self.partners
+            return self.env["partner.tax.receipt.run"].start(year)
+
+    def _get_communications(self):
+        return self.env["partner.communication.job"].search(
+            [
+                ("config_id", "=", self.config.id),
+                ("partner_id", "in", self.partners.ids),
+            ]
+        )
+
+    def test_start_splits_partners_in_chunks(self):
+        run = self._start()
+        self.assertEqual(run.state, "running")
+        self.assertEqual(len(run.chunk_ids), 3)
+        self.assertEqual(run.partner_count, 5)
+        self.assertEqual(run.chunk_ids.mapped("partner_ids"), self.partners)
+        self.assertEqual(run.progress, 0)
+
+        # Starting again resumes the same run without new chunks
+        self.assertEqual(self._start(), run)
+        self.assertEqual(len(run.chunk_ids), 3)
+
+    @mock.patch(mock_get_receipts)
+    def test_generate_chunks(self, get_receipts):
+        get_receipts.side_effect = lambda year: {}.fromkeys(self.partners.ids, 10.0)
+        run = self._start()
+        chunks = run.chunk_ids
+        chunks[0].generate_tax_receipts()
+        self.assertEqual(chunks[0].state, "done")
+        self.assertEqual(chunks[0].communication_count, 2)
+        self.assertEqual(run.state, "running")
+        self.assertEqual(run.done_count, 2)
+
+        for chunk in chunks[1:]:
+            chunk.generate_tax_receipts()
+        run.invalidate_cache()
+        self.assertEqual(run.state, "done")
+        self.assertEqual(run.done_count, 5)
+        self.assertEqual(run.progress, 100)
+        communications = self._get_communications()
+        self.assertEqual(communications.mapped("partner_id"), self.partners)
+
+    @mock.patch(mock_get_receipts)
+    def test_rerun_is_idempotent(self, get_receipts):
+        get_receipts.side_effect = lambda year: {}.fromkeys(self.partners.ids, 10.0)
+        run = self._start()
+        for chunk in run.chunk_ids:
+            chunk.generate_tax_receipts()
+        communications = self._get_communications()
+        self.assertEqual(len(communications), 5)
+
+        # A done chunk is not processed again
+        run.chunk_ids[0].generate_tax_receipts()
+        self.assertEqual(self._get_communications(), communications)
+
+        # A chunk interrupted after its communications were created skips them
+        run.write({"state": "running"})
+        run.chunk_ids[0].write({"state": "pending"})
+        run.chunk_ids[0].generate_tax_receipts()
+        self.assertEqual(self._get_communications(), communications)
+        self.assertEqual(run.chunk_ids[0].communication_count, 0)
+        self.assertEqual(run.state, "done")
+
+    @mock.patch(mock_run_wkhtmltopdf)
+    @mock.patch(mock_get_receipts)
+    def test_batch_rendering_of_attachments(self, get_receipts, run_wkhtmltopdf):
+        get_receipts.side_effect = lambda year: {}.fromkeys(self.partners.ids, 10.0)
+        run_wkhtmltopdf.return_value = b"%PDF-batch"
+        for chunk in self._start().chunk_ids:
+            chunk.generate_tax_receipts()
+        communications = self._get_communications()
+        previous = communications.mapped("attachment_ids")
+
+        communications.with_context(force_report_rendering=True).set_attachments()
+        # One rendering per partner, written on each new attachment
+        self.assertEqual(run_wkhtmltopdf.call_count, 5)
+        for communication in communications:
+            attachment = communication.attachment_ids - previous
+            self.assertEqual(len(attachment), 1)
+            self.assertEqual(
+                base64.b64decode(attachment.attachment_id.datas), b"%PDF-batch"
+            )
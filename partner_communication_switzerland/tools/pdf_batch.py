@@ -0,0 +1,235 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import base64
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from odoo import _
+from odoo.exceptions import UserError
+from odoo.tools import config
+from odoo.addons.base.models.ir_actions_report import _get_wkhtmltopdf_bin
+
+_logger = logging.getLogger(__name__)
+
+PLACEHOLDER_PREFIX = b"pdf-batch-placeholder:"
+PLACEHOLDER_MAX_SIZE = 64
+MAX_WORKERS = 4
+
+
+def _freeze(value):
+    """ Returns a hashable representation of the report data. """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return str(value)
+
+
+def _run_wkhtmltopdf(command_args, bodies, header=None, footer=None):
+    """
+    Runs one wkhtmltopdf process. This function must not touch the ORM, as
+    it is executed inside worker threads.
+    :return: binary pdf content
+    """
+    files_command_args = []
+    temporary_files = []
+    for option, html in (("--header-html", header), ("--footer-html", footer)):
+        if html:
+            fd, path = tempfile.mkstemp(suffix=".html", prefix="report.batch.tmp.")
+            with closing(os.fdopen(fd, "wb")) as html_file:
+                html_file.write(html)
+            temporary_files.append(path)
+            files_command_args.extend([option, path])
+    paths = []
+    for i, body in enumerate(bodies):
+        fd, path = tempfile.mkstemp(
+            suffix=".html", prefix="report.batch.body.tmp.%d." % i)
+        with closing(os.fdopen(fd, "wb")) as body_file:
+            body_file.write(body)
+        paths.append(path)
+        temporary_files.append(path)
+    pdf_fd, pdf_path = tempfile.mkstemp(suffix=".pdf", prefix="report.batch.tmp.")
+    os.close(pdf_fd)
+    temporary_files.append(pdf_path)
+    try:
+        process = subprocess.Popen(
+            [_get_wkhtmltopdf_bin()] + command_args + files_command_args
+            + paths + [pdf_path],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        err = process.communicate()[1]
+        if process.returncode not in (0, 1):
+            raise UserError(
+                _("Wkhtmltopdf failed (error code: %s). Message: %s")
+                % (process.returncode, err[-1000:])
+            )
+        with open(pdf_path, "rb") as pdf_document:
+            return pdf_document.read()
+    finally:
+        for path in temporary_files:
+            try:
+                os.unlink(path)
+            except OSError:
+                _logger.error("Error when trying to remove file %s", path)
+
+
+class PdfRenderBatch:
+    """
+    Collects report rendering requests of several communications and
+    renders them at once:
+
+    - identical requests (same report and same data) are rendered only once,
+    - requests are grouped by report and data shape, so that the HTML
+      rendering and the wkhtmltopdf arguments are prepared together,
+    - the wkhtmltopdf processes are run on a small pool of worker threads.
+
+    Each request gets a placeholder that is returned instead of the PDF.
+    The communication attachments created with a placeholder are bound to
+    its request when they are created, and render() writes the real PDF
+    on those attachment records.
+
+    The preparation of the HTML relies on _prepare_html and
+    _build_wkhtmltopdf_args of ir.actions.report, the same steps as
+    render_qweb_pdf. Reports not providing them use the standard rendering.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        # placeholder -> (report, data)
+        self.requests = OrderedDict()
+        # placeholder -> partner.communication.attachment records
+        self.attachments = {}
+        self._placeholders = {}
+        self.stats = {"requested": 0, "rendered": 0, "duration": 0.0}
+
+    def __len__(self):
+        return len(self.attachments)
+
+    @staticmethod
+    def can_batch(report):
+        """ Reports saved in attachments need the standard rendering. """
+        return not report.attachment and all(
+            hasattr(report, method)
+            for method in ("_prepare_html", "_build_wkhtmltopdf_args")
+        )
+
+    def add(self, report, data):
+        """
+        Registers a rendering request.
+        :param report: ir.actions.report record
+        :param data: values for the report generation
+        :return: base64 placeholder to use in place of the PDF
+        """
+        self.stats["requested"] += 1
+        key = (report.id, _freeze(data))
+        placeholder = self._placeholders.get(key)
+        if placeholder is None:
+            placeholder = base64.b64encode(
+                PLACEHOLDER_PREFIX + str(len(self.requests)).encode()
+            )
+            self._placeholders[key] = placeholder
+            self.requests[placeholder] = (report, data)
+        return placeholder
+
+    def bind(self, attachments):
+        """
+        Binds the communication attachments holding a placeholder to
+        their request.
+        :param attachments: partner.communication.attachment records
+        """
+        for attachment in attachments:
+            # Avoid reading real documents: placeholders are a few bytes long
+            if attachment.attachment_id.file_size > PLACEHOLDER_MAX_SIZE:
+                continue
+            data = attachment.attachment_id.with_context(bin_size=False).datas
+            if isinstance(data, str):
+                data = data.encode()
+            if data in self.requests:
+                self.attachments[data] = (
+                    self.attachments.get(data, attachment.browse()) | attachment
+                )
+
+    def _group_requests(self):
+        groups = OrderedDict()
+        for placeholder in self.attachments:
+            report, data = self.requests[placeholder]
+            shape = tuple(sorted(k for k in data if k != "doc_ids"))
+            groups.setdefault((report.id, shape), []).append(placeholder)
+        return groups
+
+    def render(self):
+        """
+        Renders the requests bound to communication attachments and writes
+        the PDFs on them. In test mode, the HTML is stored instead of the
+        PDF, as render_qweb_pdf does, unless force_report_rendering is set.
+        :return: dict {placeholder: base64 encoded PDF}
+        """
+        start = time.time()
+        prepared = OrderedDict()
+        result = {}
+        args_cache = {}
+        for placeholders in self._group_requests().values():
+            paperformat = self.requests[placeholders[0]][0].get_paperformat()
+            for placeholder in placeholders:
+                # Keep the environment of each request (language of partner)
+                report, data = self.requests[placeholder]
+                context = dict(report.env.context, debug=False)
+                if not config["test_enable"]:
+                    context["commit_assetsbundle"] = True
+                report = report.with_context(context)
+                data = dict(data)
+                data.setdefault("report_type", "pdf")
+                data["enable_editor"] = False
+                html = report.render_qweb_html(data.get("doc_ids"), data=data)[0]
+                if (
+                    config["test_enable"] or config["test_file"]
+                ) and not context.get("force_report_rendering"):
+                    result[placeholder] = base64.b64encode(html)
+                    continue
+                bodies, _ids, header, footer, specific_args = report._prepare_html(
+                    html.decode("utf-8")
+                )
+                args_key = (report.id, _freeze(specific_args))
+                if args_key not in args_cache:
+                    args_cache[args_key] = report._build_wkhtmltopdf_args(
+                        paperformat,
+                        context.get("landscape"),
+                        specific_paperformat_args=specific_args,
+                        set_viewport_size=context.get("set_viewport_size"),
+                    )
+                prepared[placeholder] = (args_cache[args_key], bodies, header, footer)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = OrderedDict(
+                (placeholder, executor.submit(_run_wkhtmltopdf, *args))
+                for placeholder, args in prepared.items()
+            )
+            for placeholder, future in futures.items():
+                result[placeholder] = base64.b64encode(future.result())
+        for placeholder, pdf in result.items():
+            self.attachments[placeholder].mapped("attachment_id").write(
+                {"datas": pdf}
+            )
+        self.stats["rendered"] = len(result)
+        self.stats["duration"] = time.time() - start
+        _logger.info(
+            "Batch rendered %s PDF(s) for %s request(s) in %.2f seconds",
+            self.stats["rendered"],
+            self.stats["requested"],
+            self.stats["duration"],
+        )
+        return result
@@ -8,15 +8,21 @@
 #
 ##############################################################################
 import logging
+import os
+import posixpath
+import shutil
 import tempfile
+import threading
+import time
 import uuid
 import base64
 import re
+from collections import OrderedDict
 from dateutil.relativedelta import relativedelta
 
 from odoo import api, registry, fields, models, _
 from odoo.exceptions import UserError
-from odoo.tools import mod10r
+from odoo.tools import mod10r, create_index
 from odoo.tools.config import config
 
 # fields that are synced if 'use_parent_address' is checked
@@ -41,6 +47,11 @@ THANKYOU_MAPPING = {
 
 logger = logging.getLogger(__name__)
 MAGIC_INSTALLED = False
+# Recent name_search results {(db, uid, name, ...): (time, partner ids)}
+NAME_SEARCH_CACHE = OrderedDict()
+NAME_SEARCH_CACHE_LOCK = threading.Lock()
+NAME_SEARCH_CACHE_TTL = 5
+NAME_SEARCH_CACHE_SIZE = 1000
 regex_order = re.compile('^similarity\((.*),.*\)(\s+(desc|asc))?$', re.I)
 
 try:
@@ -435,19 +446,34 @@ class ResPartner(models.Model):
     ##########################################################################
     #                              ORM METHODS                               #
     ##########################################################################
+    @api.model_cr
+    def init(self):
+        # Normalized keys used to find duplicate partners
+        create_index(
+            self.env.cr,
+            "res_partner_duplicate_email_index",
+            self._table,
+            ["(lower(trim(email)))"],
+        )
+        create_index(
+            self.env.cr,
+            "res_partner_duplicate_zip_index",
+            self._table,
+            ["(upper(replace(zip, ' ', '')))"],
+        )
+
     @api.model
     def create(self, vals):
-        duplicate_domain = self._check_duplicates_domain(vals, skip_props_check=True)
-        duplicate = self.search(duplicate_domain)
-
-        duplicate_ids = [(4, itm.id) for itm in duplicate]
-        vals.update({"partner_duplicate_ids": duplicate_ids})
+        if not self.env.context.get("skip_duplicate_check"):
+            duplicate_ids = self.find_duplicates([vals])[0]
+            vals["partner_duplicate_ids"] = [(4, itm) for itm in duplicate_ids]
         vals["ref"] = self.env["ir.sequence"].get("partner.ref")
         vals["uuid"] = uuid.uuid4()
         # Never subscribe someone to res.partner record
-        partner = super(
-            ResPartner, self.with_context(mail_create_nosubscribe=True)
-        ).create(vals)
+        context = dict(self.env.context, mail_create_nosubscribe=True)
+        # Don't propagate the import flag to the records created with partner
+        context.pop("skip_duplicate_check", None)
+        partner = super(ResPartner, self.with_context(context)).create(vals)
         partner.compute_geopoint()
         if partner.contact_type == "attached":
             partner.active = False
@@ -485,6 +511,15 @@ class ResPartner(models.Model):
             self.compute_geopoint()
         return res
 
+    @api.model
+    def _load_records_create(self, values):
+        """ Find duplicates of all imported partners at once. """
+        for vals, duplicate_ids in zip(values, self.find_duplicates(values)):
+            vals["partner_duplicate_ids"] = [(6, 0, duplicate_ids)]
+        return super(
+            ResPartner, self.with_context(skip_duplicate_check=True)
+        )._load_records_create(values)
+
     @api.multi
     @api.returns(None, lambda value: value[0])
     def copy_data(self, default=None):
@@ -517,25 +552,72 @@ class ResPartner(models.Model):
 
     @api.model
     def name_search(self, name, args=None, operator="ilike", limit=80):
-        """Extends to use trigram search."""
+        """
+        Extends to use trigram search. Partners are searched by reference,
+        name similarity and email in one query, reference matches come
+        first. Results are cached for a few seconds, as autocompletion
+        triggers the same searches many times. Exact operators (=, =like,
+        =ilike) use the standard name_search.
+        """
         if args is None:
             args = []
-        if name:
-            # First find by reference
-            res = self.search([("ref", "like", name)], limit=limit)
-            if not res:
-                res = self.search(
-                    ["|", ("name", "%", name), ("name", "ilike", name)],
-                    order="similarity(name, '%s') DESC" % name,
-                    limit=limit,
-                )
-            # Search by e-mail
-            if not res:
-                res = self.search([("email", "ilike", name)], limit=limit)
-        else:
-            res = self.search(args, limit=limit)
+        if name and operator in ("ilike", "like"):
+            key = (
+                self.env.cr.dbname,
+                self.env.uid,
+                name,
+                repr(args),
+                limit,
+                self.env.context.get("active_test", True),
+            )
+            now = time.time()
+            cached = None
+            if not config["test_enable"]:
+                with NAME_SEARCH_CACHE_LOCK:
+                    cached = NAME_SEARCH_CACHE.get(key)
+            if cached and cached[0] > now - NAME_SEARCH_CACHE_TTL:
+                partner_ids = cached[1]
+            else:
+                partner_ids = self._name_search_ids(name, args, limit)
+                with NAME_SEARCH_CACHE_LOCK:
+                    NAME_SEARCH_CACHE[key] = (now, partner_ids)
+                    while len(NAME_SEARCH_CACHE) > NAME_SEARCH_CACHE_SIZE:
+                        NAME_SEARCH_CACHE.popitem(last=False)
+            return self.browse(partner_ids).exists().name_get()
+        elif name:
+            return super().name_search(name, args, operator, limit)
+        res = self.search(args, limit=limit)
         return res.name_get()
 
+    @api.model
+    def _name_search_ids(self, name, args, limit):
+        """ Single query ranking reference, name and email matches. """
+        query = self._where_calc(args)
+        self._apply_ir_rules(query, "read")
+        from_clause, where_clause, where_params = query.get_sql()
+        pattern = "%" + name + "%"
+        self.env.cr.execute(
+            """
+            SELECT res_partner.id
+            FROM """ + from_clause + """
+            WHERE """ + (where_clause or "TRUE") + """
+            AND (res_partner.ref LIKE %s
+                 OR res_partner.name %% %s OR res_partner.name ILIKE %s
+                 OR res_partner.email ILIKE %s)
+            ORDER BY
+                CASE WHEN res_partner.ref LIKE %s THEN 0
+                     WHEN res_partner.name %% %s OR res_partner.name ILIKE %s THEN 1
+                     ELSE 2
+                END,
+                similarity(res_partner.name, %s) DESC,
+                res_partner.id
+            LIMIT %s
+        """,
+            where_params
+            + [pattern, name, pattern, pattern, pattern, name, pattern, name, limit],
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
     @api.model
     def search(self, args, offset=0, limit=None, order=None, count=False):
         """ Order search results based on similarity if name search is used."""
@@ -574,68 +656,133 @@ class ResPartner(models.Model):
                 raise
         return True
 
-    def _check_duplicates_domain(self, vals=None, skip_props_check=False):
+    @api.model
+    def find_duplicates(self, vals_list, exclude_ids=None):
         """
-        Generates a search domain to find duplicates for this partner based on various filters
-        :param dict vals: a dictionnary containing values used by the filters, inferred from self if not provided
-        :param bool skip_props_checks: whether you want to skip verifying that each variable's filter are set, thus running them all anyway
+        Finds the existing partners that may be duplicates of the given
+        partner values, using one query for all of them. Partners are
+        considered duplicates when they have:
+        - the same email,
+        - or the same zip and similar firstname and lastname,
+        - or the same zip and similar lastname and street.
+        The email and zip are normalized and looked up through indexes,
+        names and street are compared with trigram similarity. Only the
+        partners of the same company (or shared) that the user can read
+        are returned.
+        :param vals_list: list of dict containing email, firstname,
+                          lastname, zip, street and company_id
+        :param exclude_ids: list of partner ids, one for each values, that
+                            cannot be a duplicate of these values (the
+                            partner itself)
+        :return: list of lists of partner ids, one for each values
         """
-        if not vals:
-            vals = {
-                "email": self.email,
-                "firstname": self.firstname,
-                "lastname": self.lastname,
-                "zip": self.zip,
-                "street": self.street,
-            }
+        res = [[] for _i in vals_list]
+        exclude_ids = exclude_ids or [None] * len(vals_list)
+        candidates = []
+        for index, (vals, exclude_id) in enumerate(zip(vals_list, exclude_ids)):
+            candidates.append((
+                index,
+                exclude_id or None,
+                vals.get("email") or None,
+                vals.get("firstname") or None,
+                vals.get("lastname") or None,
+                vals.get("zip") or None,
+                vals.get("street") or None,
+                vals.get("company_id") or None,
+            ))
+        if not any(c[2] or c[5] for c in candidates):
+            return res
+        found = []
+        for sub_candidates in self.env.cr.split_for_in_conditions(candidates):
+            values = ",".join(
+                ["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(sub_candidates))
+            self.env.cr.execute(
+                """
+                WITH candidate(
+                    idx, exclude_id, email, firstname, lastname, zip, street,
+                    company_id
+                ) AS (
+                    VALUES """ + values + """
+                )
+                SELECT c.idx, p.id
+                FROM candidate c
+                JOIN res_partner p
+                  ON lower(trim(p.email)) = lower(trim(c.email))
+                WHERE p.active AND p.id IS DISTINCT FROM c.exclude_id::integer
+                AND (
+                    p.company_id IS NULL OR c.company_id IS NULL
+                    OR p.company_id = c.company_id::integer
+                )
+                UNION
+                SELECT c.idx, p.id
+                FROM candidate c
+                JOIN res_partner p
+                  ON upper(replace(p.zip, ' ', '')) = upper(replace(c.zip, ' ', ''))
+                WHERE p.active AND p.id IS DISTINCT FROM c.exclude_id::integer
+                AND (
+                    p.company_id IS NULL OR c.company_id IS NULL
+                    OR p.company_id = c.company_id::integer
+                )
+                AND (
+                    p.lastname ILIKE '%%' || c.lastname || '%%'
+                    OR p.lastname %% c.lastname
+                )
+                AND (
+                    p.firstname ILIKE '%%' || c.firstname || '%%'
+                    OR p.firstname %% c.firstname
+                    OR p.street ILIKE '%%' || c.street || '%%'
+                    OR p.street %% c.street
+                )
+                ORDER BY 1, 2
+            """,
+                [v for candidate in sub_candidates for v in candidate],
+            )
+            found.extend(self.env.cr.fetchall())
+        # Apply the access rules of the user on the partners found
+        allowed_ids = set(
+            self.search([("id", "in", list({row[1] for row in found}))]).ids)
+        for index, partner_id in found:
+            if partner_id in allowed_ids:
+                res[index].append(partner_id)
+        return res
 
-        # define set of checks for duplicates and required fields
-        checks = [
-            # Email check
-            (vals.get('email'), [
-                '&',
-                ('email', '=', vals.get('email')),
-                ('email', '!=', False)
-            ]),
-            # zip and name check
-            (vals.get('firstname') and vals.get('lastname') and vals.get('zip'), [
-                "&",
-                "&",
-                ("firstname", "ilike", vals.get('firstname')),
-                ("lastname", "ilike", vals.get('lastname')),
-                ("zip", "=", vals.get('zip')),
-            ]),
-            # name and address check
-            (vals.get('lastname') and vals.get('street') and vals.get('zip'), [
-                "&",
-                "&",
-                ("lastname", "ilike", vals.get('lastname')),
-                ("zip", "=", vals.get('zip')),
-                ("street", "ilike", vals.get('street'))
-            ])
-        ]
+    @api.multi
+    def _get_duplicate_values(self):
+        self.ensure_one()
+        return {
+            "email": self.email,
+            "firstname": self.firstname,
+            "lastname": self.lastname,
+            "zip": self.zip,
+            "street": self.street,
+            "company_id": self.company_id.id,
+        }
 
-        # This step builds a domain query based on the checks that
-        # passed, prepending the list with a "|" operator for all item
-        # once its size is > 1
-        search_filters = []
-        for check in checks:
-            if skip_props_check or check[0]:
-                if len(search_filters) > 0:
-                    search_filters.insert(0, "|")
-                search_filters.extend(check[1])
-        return search_filters
+    @api.multi
+    def find_duplicate_partners(self):
+        """
+        Finds the possible duplicates of the partners, at once.
+        :return: dict {partner_id: res.partner duplicates recordset}
+        """
+        duplicate_ids = self.find_duplicates(
+            [partner._get_duplicate_values() for partner in self],
+            exclude_ids=self.ids,
+        )
+        return {
+            partner.id: self.browse(ids)
+            for partner, ids in zip(self, duplicate_ids)
+        }
 
     ##########################################################################
     #                             ONCHANGE METHODS                           #
     ##########################################################################
     @api.onchange("lastname", "firstname", "zip", "email")
     def _onchange_partner(self):
-        duplicates_domain = self._check_duplicates_domain(skip_props_check=False)
-        if self.contact_type == "attached" or not duplicates_domain:
+        if self.contact_type == "attached":
             return
 
-        partner_duplicates = self.search([("id", "!=", self._origin.id)] + duplicates_domain)
+        partner_duplicates = self.browse(self.find_duplicates(
+            [self._get_duplicate_values()], exclude_ids=[self._origin.id])[0])
         if partner_duplicates:
             self.partner_duplicate_ids = partner_duplicates
             # Commit the found duplicates
@@ -753,7 +900,13 @@ class ResPartner(models.Model):
     @api.multi
     def forget_me(self):
         # Store information in CSV, inside encrypted zip file.
-        self._secure_save_data()
+        # Data of several partners is saved at once in the same file.
+        if not self.env.context.get("secure_data_saved"):
+            self._secure_save_data()
+        if len(self) > 1:
+            for partner in self.with_context(secure_data_saved=True):
+                partner.forget_me()
+            return True
 
         super().forget_me()
         # Delete other objects and custom CH fields
@@ -835,44 +988,108 @@ class ResPartner(models.Model):
 
     def _secure_save_data(self):
         """
-        Stores partner name and address in a CSV file on NAS,
-        inside a password-protected ZIP file.
+        Stores partners name and address in a CSV file on NAS,
+        inside a password-protected ZIP file. To avoid rewriting the whole
+        history, each call creates a new segment file containing only the
+        rows of the given partners. Segments are merged in the main file by
+        _compact_secure_data.
         :return: None
         """
         sftp = self._get_sftp_connection()
         if sftp:
-            config_obj = self.env["ir.config_parameter"].sudo()
-            store_path = config_obj.get_param("partner_compassion.store_path")
-            src_zip_file = tempfile.NamedTemporaryFile()
-            file_size = sftp.getfo(store_path, src_zip_file)
-            if file_size:
-                src_zip_file.flush()
-                zip_dir = tempfile.mkdtemp()
-                pyminizip.uncompress(src_zip_file.name, SftpConfig.file_pw, zip_dir, 0)
-                csv_path = zip_dir + "/partner_data.csv"
-                with open(csv_path, "a", newline="", encoding="utf-8") as csv_file:
-                    csv_writer = csv.writer(csv_file)
+            segment_dir = self._get_secure_data_segment_dir()
+            if not sftp.isdir(segment_dir):
+                sftp.makedirs(segment_dir)
+            segment_name = "partner_data_{}_{}.zip".format(
+                fields.Datetime.now().strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex
+            )
+            csv_dir = tempfile.mkdtemp()
+            csv_path = csv_dir + "/partner_data.csv"
+            with open(csv_path, "w", newline="", encoding="utf-8") as csv_file:
+                csv_writer = csv.writer(csv_file)
+                for partner in self:
                     csv_writer.writerow(
                         [
-                            str(self.id),
-                            self.ref,
-                            self.contact_address,
+                            str(partner.id),
+                            partner.ref,
+                            partner.contact_address,
                             fields.Date.today(),
                         ]
                     )
-                dst_zip_file = tempfile.NamedTemporaryFile()
-                pyminizip.compress(csv_path, "", dst_zip_file.name, SftpConfig.file_pw, 5)
-                try:
-                    sftp.putfo(dst_zip_file, store_path)
-                except Exception:
-                    logger.error(
-                        "Couldn't store secure partner data on NAS. "
-                        "Please do it manually by replicating the following "
-                        "file: " + dst_zip_file.name
-                    )
-                finally:
-                    src_zip_file.close()
-                    dst_zip_file.close()
+            dst_zip_file = tempfile.NamedTemporaryFile()
+            pyminizip.compress(csv_path, "", dst_zip_file.name, SftpConfig.file_pw, 5)
+            try:
+                sftp.putfo(dst_zip_file, segment_dir + "/" + segment_name)
+            except Exception:
+                logger.error(
+                    "Couldn't store secure partner data on NAS. "
+                    "Please do it manually by replicating the following "
+                    "file: " + dst_zip_file.name
+                )
+            finally:
+                dst_zip_file.close()
+                shutil.rmtree(csv_dir, ignore_errors=True)
+
+    @api.model
+    def _compact_secure_data(self):
+        """
+        Merges the segment files of secure partner data in the main
+        password-protected ZIP file. Called by a cron.
+        :return: True
+        """
+        sftp = self._get_sftp_connection()
+        if not sftp:
+            return True
+        config_obj = self.env["ir.config_parameter"].sudo()
+        store_path = config_obj.get_param("partner_compassion.store_path")
+        segment_dir = self._get_secure_data_segment_dir()
+        if not sftp.isdir(segment_dir):
+            return True
+        segments = sorted(
+            name for name in sftp.listdir(segment_dir) if name.endswith(".zip")
+        )
+        if not segments:
+            return True
+
+        work_dir = tempfile.mkdtemp()
+        try:
+            zip_dir = work_dir + "/main"
+            os.mkdir(zip_dir)
+            csv_path = zip_dir + "/partner_data.csv"
+            if sftp.isfile(store_path):
+                src_zip_file = work_dir + "/main.zip"
+                sftp.get(store_path, src_zip_file)
+                pyminizip.uncompress(src_zip_file, SftpConfig.file_pw, zip_dir, 0)
+            with open(csv_path, "a", encoding="utf-8") as csv_file:
+                for i, segment in enumerate(segments):
+                    segment_zip = "{}/segment_{}.zip".format(work_dir, i)
+                    segment_dir_local = "{}/segment_{}".format(work_dir, i)
+                    os.mkdir(segment_dir_local)
+                    sftp.get(segment_dir + "/" + segment, segment_zip)
+                    pyminizip.uncompress(
+                        segment_zip, SftpConfig.file_pw, segment_dir_local, 0)
+                    with open(segment_dir_local + "/partner_data.csv",
+                              encoding="utf-8") as segment_file:
+                        shutil.copyfileobj(segment_file, csv_file)
+            dst_zip_file = work_dir + "/partner_data.zip"
+            pyminizip.compress(csv_path, "", dst_zip_file, SftpConfig.file_pw, 5)
+            sftp.put(dst_zip_file, store_path)
+            for segment in segments:
+                sftp.remove(segment_dir + "/" + segment)
+            logger.info("Merged %s segments of secure partner data", len(segments))
+        except Exception:
+            logger.error("Couldn't compact secure partner data on NAS.",
+                         exc_info=True)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            sftp.close()
+        return True
+
+    @api.model
+    def _get_secure_data_segment_dir(self):
+        config_obj = self.env["ir.config_parameter"].sudo()
+        store_path = config_obj.get_param("partner_compassion.store_path")
+        return posixpath.join(posixpath.dirname(store_path), "partner_data_segments")
 
     def _get_sftp_connection(self):
         """" Retrieve configuration SMB """
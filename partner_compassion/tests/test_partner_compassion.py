@@ -82,6 +82,77 @@ class TestMessages(BaseSponsorshipTest):
         res = self.env["res.partner"].search([("name", "=", "Test Test")]).ids
         self.assertIn(self.partner.id, res)
 
+    def test_find_duplicates(self):
+        self.partner.email = "test.person@example.org"
+        res = self.env["res.partner"].find_duplicates([
+            {"email": " Test.Person@example.org", "lastname": "Other", "zip": "9999"},
+            {"lastname": "test", "zip": "2 000", "street": "testaddress 1"},
+            {"lastname": "Test", "zip": "3000", "firstname": "Test"},
+            {"lastname": "Test", "zip": "2000", "firstname": "Test"},
+        ])
+        # Same email only
+        self.assertIn(self.partner.id, res[0])
+        self.assertNotIn(self.church.id, res[0])
+        # Same zip, lastname and street
+        self.assertIn(self.partner.id, res[1])
+        self.assertNotIn(self.church.id, res[1])
+        # Different zip
+        self.assertFalse(res[2])
+        # Same zip, lastname and firstname
+        self.assertIn(self.partner.id, res[3])
+        self.assertNotIn(self.church.id, res[3])
+
+    def test_find_duplicates_of_company(self):
+        self.partner.email = "test.person@example.org"
+        company = self.env["res.company"].create({"name": "Other company"})
+        other = self.env["res.partner"].create({
+            "firstname": "Other",
+            "lastname": "Company",
+            "email": "test.person@example.org",
+            "company_id": company.id,
+        })
+        main_company = self.env.ref("base.main_company")
+        res = self.env["res.partner"].find_duplicates([
+            {"email": "test.person@example.org", "company_id": main_company.id},
+            {"email": "test.person@example.org"},
+        ])
+        # Partners of another company are not duplicates
+        self.assertIn(self.partner.id, res[0])
+        self.assertNotIn(other.id, res[0])
+        self.assertIn(other.id, res[1])
+
+    def test_find_duplicate_partners(self):
+        twin = self.env["res.partner"].with_context(skip_duplicate_check=True).create({
+            "firstname": "Test",
+            "lastname": "Test",
+            "zip": "2000",
+            "street": "TestAddress 1",
+            "city": "TestCity",
+        })
+        duplicates = (self.partner + twin + self.church).find_duplicate_partners()
+        # Partners of the same batch are duplicates of each other
+        self.assertIn(twin, duplicates[self.partner.id])
+        self.assertIn(self.partner, duplicates[twin.id])
+        # But not of themselves
+        self.assertNotIn(self.partner, duplicates[self.partner.id])
+        self.assertNotIn(twin, duplicates[twin.id])
+        self.assertNotIn(self.church, duplicates[self.partner.id])
+
+    def test_find_duplicates_on_import(self):
+        self.partner.email = "test.person@example.org"
+        partner = self.env["res.partner"]._load_records([
+            {
+                "xml_id": "partner_compassion.test_imported_partner",
+                "values": {
+                    "firstname": "Imported",
+                    "lastname": "Person",
+                    "email": "test.person@example.org",
+                    "city": "TestCity",
+                },
+            }
+        ])
+        self.assertEqual(partner.partner_duplicate_ids, self.partner)
+
     def test_get_lang_from_phone_number(self):
         lang = (
             self.env["res.partner"]
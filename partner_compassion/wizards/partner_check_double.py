@@ -43,6 +43,19 @@ class PartnerCheckDouble(models.TransientModel):
             "target": "main",
         }
 
+    @api.multi
+    def refresh_duplicates(self):
+        partner = self.partner_id
+        partner.partner_duplicate_ids = partner.find_duplicate_partners()[partner.id]
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_type": "form",
+            "view_mode": "form",
+            "target": "new",
+        }
+
     @api.multi
     def keep(self):
         self.partner_id.partner_duplicate_ids = False
@@ -54,6 +54,36 @@ class ResPartner(models.Model):
         )
         return sum(invoice_lines.mapped("price_subtotal"))
 
+    @api.multi
+    def get_receipts(self, year):
+        """
+        Same as get_receipt, for several partners with one grouped query.
+        :param year: int: year of selection
+        :return: dict {partner_id: total amount}
+        """
+        invoice_lines = self.env["account.invoice.line"]
+        related = self | self.mapped("parent_id") | self.mapped("child_ids")
+        groups = invoice_lines.read_group(
+            [
+                ("last_payment", ">=", date(year, 1, 1)),
+                ("last_payment", "<=", date(year, 12, 31)),
+                ("state", "=", "paid"),
+                ("product_id.requires_thankyou", "=", True),
+                ("partner_id", "in", related.ids),
+            ],
+            ["price_subtotal"],
+            ["partner_id"],
+            lazy=False,
+        )
+        amounts = {g["partner_id"][0]: g["price_subtotal"] for g in groups}
+        return {
+            partner.id: sum(
+                amounts.get(p.id, 0.0)
+                for p in partner | partner.parent_id | partner.child_ids
+            )
+            for partner in self
+        }
+
     @api.multi
     def _compute_date_communication(self):
         """City and date displayed in the top right of a letter for Yverdon"""
@@ -29,7 +29,7 @@
 # pylint: disable=C8101
 {
     "name": "Sponsor to beneficiary email communication",
-    "version": "12.0.2.0.0",
+    "version": "12.0.2.0.1",
     "category": "Other",
     "author": "Compassion CH",
     "license": "AGPL-3",
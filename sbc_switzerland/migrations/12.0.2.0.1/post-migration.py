@@ -0,0 +1,28 @@
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate()
+def migrate(env, version):
+    if not version:
+        return
+
+    # The previews are now generated when letters change, remove the old cron
+    cron = env.ref("sbc_switzerland.letter_thumbnails_cron", False)
+    if cron:
+        cron.unlink()
+
+    # Generate the missing previews of the translated letters once
+    env.cr.execute(
+        """
+        SELECT c.id FROM correspondence c
+        WHERE c.new_translator_id IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM ir_attachment a
+            WHERE a.res_model = 'correspondence' AND a.res_id = c.id
+            AND a.name = 'letter_thumbnail'
+        )
+        ORDER BY c.id DESC
+    """
+    )
+    letter_ids = [row[0] for row in env.cr.fetchall()]
+    env["correspondence"].browse(letter_ids).enqueue_letter_thumbnails()
@@ -8,12 +8,14 @@
 #
 ##############################################################################
 import base64
+import hashlib
 import logging
 
 from io import BytesIO
 
 
 from odoo import models, api, fields
+from odoo.addons.queue_job.job import identity_exact
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,18 @@ try:
 except ImportError:
     logger.warning("Please install pyPdf.")
 
+try:
+    from wand.image import Image as WandImage
+except ImportError:
+    logger.warning("Please install wand.")
+
+# Preview of the letters displayed in the translation reports
+THUMBNAIL_NAME = "letter_thumbnail"
+# Checksum stored on the preview of letters without image
+THUMBNAIL_NO_IMAGE = "no_image"
+THUMBNAIL_RESOLUTION = 75
+THUMBNAIL_BATCH_SIZE = 50
+
 
 class S2BGenerator(models.Model):
     _inherit = "correspondence.s2b.generator"
@@ -82,11 +96,94 @@ class Correspondence(models.Model):
                     {"letter_image": base64.b64encode(letter_data.read())}
                 )
 
+        correspondence.enqueue_letter_thumbnails()
         return correspondence
 
+    @api.multi
+    def write(self, vals):
+        if "letter_image" in vals:
+            self._get_letter_thumbnails().unlink()
+        res = super().write(vals)
+        if "letter_image" in vals or vals.get("new_translator_id"):
+            self.enqueue_letter_thumbnails()
+        return res
+
+    @api.multi
+    def unlink(self):
+        self._get_letter_thumbnails().unlink()
+        return super().unlink()
+
     ##########################################################################
     #                             PUBLIC METHODS                             #
     ##########################################################################
+    @api.multi
+    def get_letter_thumbnails(self):
+        """
+        Reads the stored previews of the letters. They are never rendered
+        here, see generate_letter_thumbnails.
+        :return: dict {letter_id: base64 jpg image}
+        """
+        return {
+            thumbnail.res_id: thumbnail.datas
+            for thumbnail in self._get_letter_thumbnails()
+        }
+
+    @api.multi
+    def generate_letter_thumbnails(self):
+        """
+        Renders the preview of the first page of the letters, unless the
+        stored preview was made from the same letter image. Letters without
+        image get an empty preview, so that they are not rendered again.
+        Called in a queue job.
+        :return: True
+        """
+        checksums = self._get_letter_image_checksums()
+        thumbnails = {t.res_id: t for t in self._get_letter_thumbnails()}
+        for letter in self:
+            thumbnail = thumbnails.get(letter.id)
+            checksum = checksums.get(letter.id)
+            if thumbnail and checksum and thumbnail.description == checksum:
+                continue
+            pdf = letter.get_image()
+            if pdf:
+                checksum = checksum or hashlib.sha1(pdf).hexdigest()
+                if thumbnail and thumbnail.description == checksum:
+                    continue
+                with WandImage(blob=pdf, resolution=THUMBNAIL_RESOLUTION) as letter_pdf:
+                    with WandImage(image=letter_pdf.sequence[0]) as first_page:
+                        data = base64.b64encode(first_page.make_blob("jpg"))
+                vals = {"datas": data, "description": checksum}
+            elif thumbnail:
+                continue
+            else:
+                vals = {"datas": False, "description": THUMBNAIL_NO_IMAGE}
+            if thumbnail:
+                thumbnail.write(vals)
+            else:
+                vals.update({
+                    "name": THUMBNAIL_NAME,
+                    "datas_fname": "letter_{}.jpg".format(letter.id),
+                    "res_model": self._name,
+                    "res_id": letter.id,
+                })
+                self.env["ir.attachment"].sudo().create(vals)
+        return True
+
+    @api.multi
+    def enqueue_letter_thumbnails(self):
+        """
+        Creates the jobs rendering the previews of the translated letters,
+        displayed in the translation reports. Called when a letter is created
+        or taken by a translator, or when the letter image changes.
+        :return: True
+        """
+        letter_ids = self.filtered("new_translator_id").ids
+        for i in range(0, len(letter_ids), THUMBNAIL_BATCH_SIZE):
+            self.browse(letter_ids[i:i + THUMBNAIL_BATCH_SIZE]).with_delay(
+                identity_key=identity_exact
+            ).generate_letter_thumbnails()
+        return True
+
     @api.multi
     def process_letter(self):
         """ Called when B2S letter is Published. Check if translation is
@@ -127,4 +224,25 @@ class Correspondence(models.Model):
         translation_supervisor = self.env["res.users"].sudo().search([("email", "=", "sds@compassion.ch")])
         for letter in self.filtered(lambda l: not l.translation_supervisor_id):
             letter.translation_supervisor_id = translation_supervisor
-        return True
\ No newline at end of file
+        return True
+
+    ##########################################################################
+    #                             PRIVATE METHODS                            #
+    ##########################################################################
+    @api.multi
+    def _get_letter_thumbnails(self):
+        return self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_id", "in", self.ids),
+            ("name", "=", THUMBNAIL_NAME),
+        ])
+
+    @api.multi
+    def _get_letter_image_checksums(self):
+        """ Checksums of the letter images stored in attachments. """
+        attachments = self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_id", "in", self.ids),
+            ("res_field", "=", "letter_image"),
+        ])
+        return {attachment.res_id: attachment.checksum for attachment in attachments}
@@ -13,7 +13,11 @@ between the database and the mail.
 """
 import base64
 import logging
+import threading
+import time
 import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from paramiko.ssh_exception import SSHException
@@ -31,6 +35,10 @@ try:
 except ImportError:
     logger.warning("Please install python dependencies.")
 
+# Concurrent SFTP transfers and number of files downloaded in advance
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_PREFETCH = 8
+
 
 class SftpConnection:
     """
@@ -128,7 +136,10 @@ class ImportLettersHistory(models.Model):
     def sftp_generator(self):
         """
         Generator function for the sftp imports
-        Read the files from the specified stfp directory and analyse them
+        Read the files from the specified stfp directory and analyse them.
+        The next files are downloaded in advance by several SFTP connections
+        while the current file is analysed. Each analysed file is then moved
+        on the NAS by the same connections, without waiting for the rename.
 
         yield:
             int: the current step in the analysis
@@ -140,23 +151,73 @@ class ImportLettersHistory(models.Model):
             imported_letter_path = Path(self.env.ref("sbc_switzerland.scan_letter_done").value)
         except TypeError:
             return
+        key = self.env.ref("sbc_switzerland.nas_ssh_key").value
+        share = self.env.ref("sbc_switzerland.share_on_nas").value
+        local = threading.local()
+        connections = []
+
+        # The functions below run in worker threads, each one using its own
+        # SFTP connection.
+        def _get_worker_connection():
+            sftp_conn = getattr(local, "sftp", None)
+            if sftp_conn is None:
+                sftp_conn = local.sftp = SftpConnection(key).get_connection(share)
+                connections.append(sftp_conn)
+            return sftp_conn
+
+        def _download(path):
+            with _get_worker_connection().open(path) as pdf_file:
+                pdf_file.prefetch()
+                return pdf_file.read()
+
+        def _move(import_full_path, imported_full_path):
+            try:
+                _get_worker_connection().rename(import_full_path, imported_full_path)
+            except Exception:
+                logger.warning(
+                    f"Failed to move a file on NAS :\n{traceback.format_exc()}"
+                )
+
         try:
             with self._get_connection() as sftp:
-                files = sftp.listdir(str(import_letter_path))
+                files = [Path(file) for file in sftp.listdir(str(import_letter_path))]
+            executor = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS)
+            downloads = deque()
+            start = time.time()
+            files_to_download = iter(files)
+
+            def _prefetch_next():
+                file_to_download = next(files_to_download, None)
+                if file_to_download is not None:
+                    downloads.append(executor.submit(
+                        _download, str(import_letter_path / file_to_download)))
+
+            try:
+                for _i in range(DOWNLOAD_PREFETCH):
+                    _prefetch_next()
                 for i, file in enumerate(files):
-                    file = Path(file)
                     import_full_path = str(import_letter_path / file)
                     imported_full_path = str(imported_letter_path / file)
 
                     yield i + 1, len(files), import_full_path
 
-                    pdf_data = sftp.open(import_full_path).read()
+                    pdf_data = downloads.popleft().result()
+                    _prefetch_next()
                     self._analyze_pdf(pdf_data, file)
-
-                    try:
-                        sftp.rename(import_full_path, imported_full_path)
-                    except Exception as e:
-                        logger.warning(f"Failed to move a file on NAS :\n{traceback.format_exc()}")
+                    # The file is moved by a worker while the next one is analysed
+                    executor.submit(_move, import_full_path, imported_full_path)
+                duration = time.time() - start
+                logger.info(
+                    "Imported %s letters from NAS in %.1f seconds "
+                    "(%.1f letters per minute)",
+                    len(files), duration,
+                    len(files) * 60.0 / duration if duration else len(files),
+                )
+            finally:
+                # Wait for the pending moves before closing the connections
+                executor.shutdown(wait=True)
+                for sftp_conn in connections:
+                    sftp_conn.close()
         except (AssertionError, IOError) as e:
             logger.error("Could not establish connection with sftp server")
             return
@@ -12,11 +12,6 @@ from odoo import models, fields, api
 
 _logger = logging.getLogger(__name__)
 
-try:
-    from wand.image import Image as WandImage
-except ImportError:
-    _logger.warning("Please wand to use SBC module")
-
 
 class TranslationDailyReport(models.Model):
     _name = "translation.daily.report"
@@ -61,11 +56,10 @@ class TranslationDailyReport(models.Model):
 
     @api.multi
     def _compute_letter_image(self):
-        for report in self.filtered("correspondence_id"):
-            pdf = self.correspondence_id.get_image()
-            if pdf:
-                with WandImage(blob=pdf, resolution=75) as letter_image:
-                    report.letter_image = letter_image.make_blob("jpg").encode("base64")
+        # Previews are rendered in background jobs, we only read them here
+        thumbnails = self.mapped("correspondence_id").get_letter_thumbnails()
+        for report in self:
+            report.letter_image = thumbnails.get(report.correspondence_id.id)
 
     def _date_format(self):
         """
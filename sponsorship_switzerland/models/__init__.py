@@ -12,6 +12,7 @@ from . import contracts
 from . import account_invoice
 from . import res_partner_category
 from . import completion_rules
+from . import account_bank_statement_import
 from . import account_banking_mandate
 from . import contract_group
 from . import gift_compassion
@@ -0,0 +1,35 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from odoo import models
+
+from .completion_rules import StatementCompletionIndex
+
+
+class AccountBankStatementImport(models.TransientModel):
+    _inherit = "account.bank.statement.import"
+
+    def _complete_stmts_vals(self, stmts_vals, journal, account_number):
+        """
+        Builds the completion rules lookup index once for the import and
+        shares it with the completion of all the statement lines.
+        """
+        index = StatementCompletionIndex()
+        index.load_refs(
+            self.env,
+            (
+                line.get("ref")
+                for st_vals in stmts_vals
+                for line in st_vals.get("transactions", [])
+            ),
+        )
+        return super(
+            AccountBankStatementImport,
+            self.with_context(statement_completion_index=index),
+        )._complete_stmts_vals(stmts_vals, journal, account_number)
@@ -20,6 +20,89 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+class StatementCompletionIndex:
+    """
+    Lookup tables built once per statements import and shared by all the
+    imported lines, to avoid repeating the same searches for every line.
+    The index only holds ids, records are browsed in the caller environment.
+    """
+
+    def __init__(self):
+        self.loaded_refs = set()
+        # partner ref -> partner ids
+        self.partners_by_ref = {}
+        # bvr reference -> contract group ids
+        self.groups_by_bvr = {}
+        # bvr reference -> partner id of open invoices
+        self.invoice_partners_by_ref = {}
+        self.invoice_partners_by_isr = {}
+        # Memoized searches (products, sponsor names)
+        self.searches = {}
+
+    def load_refs(self, env, refs):
+        """ Loads the lookup tables for the given statement line references."""
+        refs = {ref for ref in refs if ref} - self.loaded_refs
+        if not refs:
+            return
+        self.loaded_refs |= refs
+        refs = list(refs)
+        # 7 numbers partner references and 6 numbers legacy references
+        partner_refs = list({ref[9:16] for ref in refs} | {ref[10:16] for ref in refs})
+        for partner in env["res.partner"].search_read(
+                [("ref", "in", partner_refs)], ["ref"]):
+            self.partners_by_ref.setdefault(partner["ref"], []).append(partner["id"])
+        for group in env["recurring.contract.group"].search(
+                [("bvr_reference", "in", refs)]).filtered("contains_sponsorship"):
+            self.groups_by_bvr.setdefault(group.bvr_reference, []).append(group.id)
+        for invoice in env["account.invoice"].search_read(
+                [
+                    ("state", "=", "open"),
+                    "|",
+                    ("reference", "in", refs),
+                    ("isr_reference", "in", refs),
+                ],
+                ["reference", "isr_reference", "partner_id"],
+        ):
+            partner_id = invoice["partner_id"] and invoice["partner_id"][0]
+            if invoice["reference"]:
+                self.invoice_partners_by_ref.setdefault(
+                    invoice["reference"], partner_id)
+            if invoice["isr_reference"]:
+                self.invoice_partners_by_isr.setdefault(
+                    invoice["isr_reference"], partner_id)
+
+    def get_partners(self, env, ref):
+        """ Partners matching the 7 or 6 numbers reference inside the line ref."""
+        self.load_refs(env, [ref])
+        partner_ids = set(self.partners_by_ref.get(ref[9:16], []))
+        partner_ids.update(self.partners_by_ref.get(ref[10:16], []))
+        return env["res.partner"].browse(sorted(partner_ids))
+
+    def get_contract_groups(self, env, bvr_ref):
+        self.load_refs(env, [bvr_ref])
+        return env["recurring.contract.group"].browse(
+            self.groups_by_bvr.get(bvr_ref, []))
+
+    def get_open_invoice_partner(self, env, bvr_ref):
+        self.load_refs(env, [bvr_ref])
+        partner_id = self.invoice_partners_by_ref.get(bvr_ref)
+        if not partner_id:
+            partner_id = self.invoice_partners_by_isr.get(bvr_ref)
+        return env["res.partner"].browse(partner_id)
+
+    def add_open_invoice(self, invoice):
+        if invoice.reference:
+            self.invoice_partners_by_ref.setdefault(
+                invoice.reference, invoice.partner_id.id)
+
+    def search(self, env, model, domain, limit=None):
+        """ Memoized search, for lookups that cannot be loaded at once. """
+        key = (model, repr(domain), limit)
+        if key not in self.searches:
+            self.searches[key] = env[model].search(domain, limit=limit).ids
+        return env[model].browse(self.searches[key])
+
+
 class StatementCompletionRule(models.Model):
     """ Rules to complete account bank statements."""
 
@@ -88,11 +171,9 @@ class StatementCompletionRule(models.Model):
         ref_index_start = 9  # position where the partner ref starts in the BVR
         ref_index_end = 16  # position where the partner ref ends in the BVR
         partner_ref = ref[ref_index_end-7:ref_index_end]  # get standard 7 numbers ref
-        old_partner_ref = ref[ref_index_end-6:ref_index_end]  # get legacy 6 numbers ref
-        partner_obj = self.env["res.partner"]
-        partner = partner_obj.search(["|",
-                                      ("ref", "=", partner_ref),
-                                      ("ref", "=", old_partner_ref)])
+        # Partners with the standard 7 numbers or the legacy 6 numbers ref
+        index = self._get_completion_index()
+        partner = index.get_partners(self.env, ref)
         if not partner:
             # Some bvr reference have a wrong number of leading zeros,
             # resulting in the partner reference to be offset.
@@ -101,7 +182,8 @@ class StatementCompletionRule(models.Model):
                 flexible_ref = flexible_ref_match.group(1)
                 if int(flexible_ref) != int(partner_ref):
                     logger.warning(f"The partner reference might be misaligned: {ref}")
-                    partner = partner_obj.search([("ref", "=", str(int(flexible_ref)))])
+                    partner = index.search(
+                        self.env, "res.partner", [("ref", "=", str(int(flexible_ref)))])
                     ref_index_start = flexible_ref_match.start(1)
         if len(partner) > 1:
             # Take only those who have active sponsorships
@@ -241,8 +323,10 @@ class StatementCompletionRule(models.Model):
         wire_transfer_pattern = "VIREMENT DU COMPTE "
         patterns_lookup = [" EXPÉDITEUR: ", " DONNEUR D'ORDRE: ", wire_transfer_pattern]
 
+        index = self._get_completion_index()
+
         def search_partner(criteria):
-            return self.env["res.partner"].search(criteria)
+            return index.search(self.env, "res.partner", criteria)
 
         for pattern in patterns_lookup:
             if pattern in name:
@@ -288,6 +372,15 @@ class StatementCompletionRule(models.Model):
     #                             PRIVATE METHODS                            #
     ##########################################################################
 
+    def _get_completion_index(self):
+        """
+        Returns the lookup index shared by the lines of the statements being
+        imported, or a new index when the rules are called outside an import.
+        """
+        return self.env.context.get(
+            "statement_completion_index"
+        ) or StatementCompletionIndex()
+
     def _generate_invoice(self, stmts_vals, st_line, partner, ref_index):
         """
         Generates an invoice corresponding to the statement line read
@@ -374,6 +467,7 @@ class StatementCompletionRule(models.Model):
         )
 
         invoice.action_invoice_open()
+        self._get_completion_index().add_open_invoice(invoice)
 
         return res, True
 
@@ -408,37 +502,28 @@ class StatementCompletionRule(models.Model):
     def _search_partner_by_bvr_ref(self, bvr_ref, search_old_invoices=False):
         """ Finds a partner given its bvr reference. """
         partner = None
-        contract_group_obj = self.env["recurring.contract.group"]
-        contract_groups = contract_group_obj.search([("bvr_reference", "=", bvr_ref)]).filtered('contains_sponsorship')
+        index = self._get_completion_index()
+        contract_groups = index.get_contract_groups(self.env, bvr_ref)
         if contract_groups:
             partner = contract_groups[0].partner_id
         else:
-            # Search open Customer Invoices (with field 'bvr_reference' set)
-            invoice_obj = self.env["account.invoice"]
-            invoice_search = [("reference", "=", bvr_ref), ("state", "=", "open")]
-            if search_old_invoices:
-                invoice_search[1] = ("state", "in", ("open", "cancel", "paid"))
-            invoices = invoice_obj.search(invoice_search)
-            if not invoices:
-                # Search open Supplier Invoices (with field 'reference_type'
-                # set to BVR)
-                invoices = invoice_obj.search(
-                    [
-                        "|",
-                        ("reference", "=", bvr_ref),
-                        ("isr_reference", "=", bvr_ref),
-                        ("state", "=", "open"),
-                    ]
-                )
-            if invoices:
-                partner = invoices[0].partner_id
+            # Search open Customer and Supplier Invoices (with field
+            # 'bvr_reference' or 'reference_type' set to BVR)
+            partner = index.get_open_invoice_partner(self.env, bvr_ref)
+            if not partner and search_old_invoices:
+                invoices = index.search(self.env, "account.invoice", [
+                    ("reference", "=", bvr_ref),
+                    ("state", "in", ("cancel", "paid")),
+                ], limit=1)
+                partner = invoices.partner_id or None
 
         return partner
 
     def _find_product_id(self, partner_ref, ref):
         """ Finds what kind of payment it is,
             based on the reference of the statement line. """
-        product_obj = self.env["product.product"].with_context(lang="en_US")
+        index = self._get_completion_index()
+        env = self.with_context(lang="en_US").env
         # Search for payment type in a flexible manner given its neighbours
         # after partner ref: 5 digits for num pole, 1 digit for type, 4 digit for code spe and 1 digit for cc
         payment_type_match = re.search(partner_ref + r"[0-9]{5}([0-9]){1}[0-9]{5}", ref)
@@ -452,13 +537,16 @@ class StatementCompletionRule(models.Model):
         product = 0
         if payment_type in range(1, 6):
             # Sponsor Gift
-            products = product_obj.search(
+            products = index.search(
+                env, "product.product",
                 [("default_code", "=", GIFT_REF[payment_type - 1])]
             )
             product = products[0] if products else 0
         elif payment_type in range(6, 8):
             # Fund donation
-            products = product_obj.search(
+            products = index.search(
+                env,
+                "product.product",
                 [
                     (
                         "fund_id",
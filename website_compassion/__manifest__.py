@@ -29,7 +29,7 @@
 # pylint: disable=C8101
 {
     "name": "Compassion Website",
-    "version": "12.0.1.0.1",
+    "version": "12.0.1.0.2",
     "category": "Website",
     "author": "Sebastien Toth",
     "license": "AGPL-3",
@@ -6,17 +6,13 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
-from urllib.error import HTTPError
-
 from .auto_texts import CHRISTMAS_TEXTS
 
 import base64
 from datetime import datetime, timedelta
 from base64 import b64decode, b64encode
-from os import path, remove
+from os import path
 from urllib.parse import urlparse, urlencode
-from zipfile import ZipFile
-from urllib.request import urlretrieve, urlopen
 from math import ceil
 import secrets
 from passlib.context import CryptContext
@@ -24,7 +20,7 @@ from passlib.context import CryptContext
 from werkzeug.datastructures import Headers
 from werkzeug.wrappers import Response
 
-from odoo import fields, _
+from odoo import _
 from odoo.http import request, route, local_redirect
 from odoo.addons.web.controllers.main import content_disposition
 from odoo.addons.cms_form_compassion.controllers.payment_controller import (
@@ -32,8 +28,10 @@ from odoo.addons.cms_form_compassion.controllers.payment_controller import (
 )
 
 from ..tools.image_compression import compress_big_images
+from ..tools.zip_stream import stream_zip
+from ..models.compassion_child_pictures import RENDITIONS, RENDITION_FIELDS
 
-IMG_URL = "https://erp.compassion.ch/web/image/compassion.child.pictures/{id}/fullshot/"
+RENDITION_MAX_AGE = 365 * 24 * 3600
 
 
 def _get_user_children(state=None):
@@ -100,43 +98,59 @@ def _fetch_images_from_child(child):
     return images
 
 
+def _get_picture_sources(images):
+    """
+    Find where the full shots of the given pictures are stored, so that they
+    can be read directly from the filestore without going through the ORM.
+    :param images: a list of tuples of the form [(image1, full_path1), ...]
+    :return: a list of tuples (full_path, source) where source is either the
+             path of the file in the filestore or the binary content.
+    """
+    pictures = request.env["compassion.child.pictures"].sudo().browse(
+        [img.id for (img, full_path) in images])
+    attachments = request.env["ir.attachment"].sudo().search([
+        ("res_model", "=", pictures._name),
+        ("res_field", "=", "fullshot"),
+        ("res_id", "in", pictures.ids),
+    ])
+    file_paths = {
+        att.res_id: att._full_path(att.store_fname)
+        for att in attachments if att.store_fname
+    }
+    sources = []
+    for (img, full_path) in images:
+        source = file_paths.get(img.id)
+        if source is None:
+            fullshot = pictures.browse(img.id).fullshot
+            if not fullshot:
+                continue
+            source = b64decode(fullshot)
+        sources.append((full_path, source))
+    return sources
+
+
 def _create_archive(images, archive_name):
     """
     Create an archive from a list of images and the name of the future archive.
-    Some files are created locally but are deleted after they are used by the
-    method.
+    The archive is streamed to the client while it is built, so that neither
+    the worker memory nor the disk hold the whole archive.
     :param images: a list of tuples of the form [(image1, full_path1), ...]
     :param archive_name: the name of the future archive
     :return: a response for the client to download the created archive
     """
-    with ZipFile(archive_name, "w") as archive:
-        for (img, full_path) in images:
-            filename = path.basename(full_path)
-
-            # Create file, write to archive and delete it from os
-            img_url = IMG_URL.format(id=img.id)
-            try:
-                urlretrieve(img_url, filename)
-            except HTTPError:
-                continue
-            archive.write(filename, full_path)
-            remove(filename)
-
-    # Get binary content of the archive, then delete the latter
-    with open(archive_name, "rb") as archive:
-        zip_data = archive.read()
-    remove(archive_name)
-
-    return request.make_response(
-        zip_data,
-        [("Content-Type", "application/zip"),
-         ("Content-Disposition", content_disposition(archive_name))]
+    headers = Headers()
+    headers.add("Content-Disposition", content_disposition(archive_name))
+    return Response(
+        stream_zip(_get_picture_sources(images)),
+        content_type="application/zip",
+        headers=headers,
+        direct_passthrough=True,
     )
 
 
 def _single_image_response(image):
     ext = image.image_url.split(".")[-1]
-    data = urlopen(IMG_URL.format(id=image.id)).read()
+    data = b64decode(image.sudo().fullshot or b"")
     filename = f"{image.child_id.preferred_name}_{image.date}.{ext}"
 
     return request.make_response(
@@ -523,8 +537,9 @@ class MyAccountController(PaymentFormController):
         ]
 
         sudo_invoice_env = request.env["account.invoice"].sudo()
+        summary = partner.get_portal_donations_summary()
 
-        all_invoice_count = sudo_invoice_env.search_count(invoice_search_criteria)
+        all_invoice_count = summary["paid_invoice_count"]
 
         invoice_per_page = int(invoice_per_page) if isinstance(invoice_per_page, str) else invoice_per_page
         invoice_page = invoice_page if invoice_page >= 1 and (
@@ -537,50 +552,21 @@ class MyAccountController(PaymentFormController):
                                            offset=(invoice_page - 1) * invoice_per_page,
                                            limit=invoice_per_page)
 
-        in_one_month = datetime.today() + timedelta(days=30)
-        due_invoices = sudo_invoice_env.search([
-            ("partner_id", "=", partner.id),
-            ("state", "=", "open"),
-            ("invoice_category", "=", "sponsorship"),
-            ("type", "=", "out_invoice"),
-            ("amount_total", "!=", 0),
-            ("date_invoice", "<", fields.Date.to_string(in_one_month))
-        ])
+        due_invoices = sudo_invoice_env.browse(summary["due_invoice_ids"])
 
         last_completed_tax_receipt = partner.last_completed_tax_receipt
 
-        groups = partner.sponsorship_ids.filtered(
-            lambda s: s.state not in ["cancelled", "terminated"] and partner == s.mapped("partner_id")
-        ).mapped("group_id")
+        groups = request.env["recurring.contract.group"].browse(summary["group_ids"])
 
-        # List of recordset of sponsorships (one recordset for each group)
-        sponsorships_by_group = [
-            g.mapped("contract_ids").filtered(
-                lambda c: c.state not in ["cancelled", "terminated", "draft"] and
-                          c.partner_id == partner
-            ) for g in groups
-        ]
         # List of integers representing the total amount by group
-        amount_by_group = [
-            sum(list(filter(
-                lambda a: a != 42.0,
-                sponsor.filtered(lambda s: s.type == "S")
-                    .mapped("contract_line_ids").mapped("amount")
-            ))) for sponsor in sponsorships_by_group
-        ]
-        # List of recordset of paid sponsorships (one recordset for each group)
-        paid_sponsor_count_by_group = [
-            len(sponsorship.filtered(lambda s: s.type == "S"))
-            for sponsorship in sponsorships_by_group
-        ]
+        amount_by_group = summary["amount_by_group"]
+        # List of the number of paid sponsorships (one for each group)
+        paid_sponsor_count_by_group = summary["paid_sponsor_count_by_group"]
         paid_sponsorships = (partner.contracts_fully_managed
                              + partner.contracts_paid) \
             .filtered(lambda a: a.state not in ["cancelled", "terminated", "draft"])
-        # List of recordset of write and pray sponsorships (one recordset for each group)
-        wp_sponsor_count_by_group = [
-            len(sponsorship.filtered(lambda s: s.type in ["SC", "SWP"]))
-            for sponsorship in sponsorships_by_group
-        ]
+        # List of the number of write and pray sponsorships (one for each group)
+        wp_sponsor_count_by_group = summary["wp_sponsor_count_by_group"]
 
         # List of strings (one bvr reference for each group)
         bvr_references = groups.mapped("bvr_reference")
@@ -611,15 +597,8 @@ class MyAccountController(PaymentFormController):
             payment_options_form.form_process()
             form_success = payment_options_form.form_success
 
-        create_date = sudo_invoice_env.search([
-            ("partner_id", "=", partner.id),
-            ("state", "=", "paid"),
-            ("type", "=", "out_invoice"),
-            ("amount_total", "!=", 0),
-        ], limit=1, order="create_date asc").create_date
-
         current_year = datetime.today().year
-        first_year = create_date.year if create_date else current_year
+        first_year = summary["first_year"] or current_year
 
         currency = (paid_sponsorships.mapped("invoice_line_ids.currency_id.name") or [False])[0] or "CHF"
         upgrade_button_format = f"% {currency}"
@@ -715,6 +694,34 @@ class MyAccountController(PaymentFormController):
             partner.write({"image": image_value})
         return request.redirect("/my/information")
 
+    @route("/my/picture/<int:picture_id>/<string:field>/<string:size>",
+           type="http", auth="user", website=True, sitemap=False)
+    def picture_rendition(self, picture_id, field, size, **kw):
+        """
+        The route to display a resized picture of a sponsored child. The
+        rendition is generated once and can be cached by the browser, as its
+        URL changes when the picture changes.
+        :param picture_id: the id of the compassion.child.pictures
+        :param field: fullshot or headshot
+        :param size: thumbnail, card or full
+        :return: a response with the image
+        """
+        picture = request.env["compassion.child.pictures"].sudo().browse(picture_id)
+        if not picture.exists() or picture.child_id not in _get_user_children() \
+                or field not in RENDITION_FIELDS or size not in RENDITIONS:
+            return request.not_found()
+        rendition = picture.get_rendition(field, size)
+        if not rendition:
+            return request.not_found()
+        headers = [
+            ("Content-Type", rendition.mimetype or "image/jpeg"),
+            ("Cache-Control", "private, max-age=%d" % RENDITION_MAX_AGE),
+            ("ETag", '"%s"' % rendition.checksum),
+        ]
+        if rendition.checksum in request.httprequest.if_none_match:
+            return Response(status=304, headers=headers)
+        return request.make_response(b64decode(rendition.datas), headers)
+
     @route("/my/download/<source>", type="http", auth="user", website=True)
     def download_file(self, source, **kw):
         """
@@ -0,0 +1,13 @@
+from openupgradelib import openupgrade
+
+
+@openupgrade.migrate(use_env=True)
+def migrate(env, version):
+    if not version:
+        return
+
+    # Generate the renditions of the pictures displayed to the sponsors
+    pictures = env["compassion.child.pictures"].search([
+        ("child_id.state", "=", "P"),
+    ])
+    pictures._enqueue_renditions()
@@ -12,4 +12,5 @@ from . import invoice_line
 from . import mail_activity
 from . import compassion_child_pictures
 from . import res_user
+from . import res_partner
 from . import password_security_home_requirements
@@ -7,7 +7,21 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
-from odoo import models
+from psycopg2 import OperationalError, errorcodes
+
+from odoo import api, models
+from odoo.addons.queue_job.exception import RetryableJobError
+from odoo.addons.queue_job.job import identity_exact
+
+from ..tools.image_compression import compress_big_images
+
+# Sizes of the pictures displayed on the portal (max width, max height)
+RENDITIONS = {
+    "thumbnail": (150, 150),
+    "card": (300, 300),
+    "full": (900, 900),
+}
+RENDITION_FIELDS = ("fullshot", "headshot")
 
 
 class CompassionChildPictures(models.Model):
@@ -15,3 +29,111 @@ class CompassionChildPictures(models.Model):
 
     _name = "compassion.child.pictures"
     _inherit = ["compassion.child.pictures", "translatable.model"]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        pictures = super().create(vals_list)
+        # Prepare the renditions of the pictures displayed on the portal
+        pictures._enqueue_renditions()
+        return pictures
+
+    @api.multi
+    def write(self, vals):
+        changed = any(field in vals for field in RENDITION_FIELDS)
+        if changed:
+            self._get_renditions().unlink()
+        res = super().write(vals)
+        if changed:
+            self._enqueue_renditions()
+        return res
+
+    @api.multi
+    def unlink(self):
+        self._get_renditions().unlink()
+        return super().unlink()
+
+    @api.multi
+    def _get_renditions(self, field=None, size=None):
+        name = "rendition_{}_{}".format(field or "%", size or "%")
+        return self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_id", "in", self.ids),
+            ("name", "=like", name),
+        ])
+
+    @api.multi
+    def _enqueue_renditions(self):
+        for picture in self.sudo():
+            if any(picture.with_context(bin_size=True)[field]
+                   for field in RENDITION_FIELDS):
+                picture.with_delay(
+                    identity_key=identity_exact).generate_renditions()
+        return True
+
+    @api.multi
+    def generate_renditions(self):
+        """
+        Job generating the missing renditions of the pictures. The picture
+        rows are locked first: a job generating the renditions of the same
+        pictures is retried later instead of creating the attachments twice.
+        """
+        try:
+            self.env.cr.execute(
+                "SELECT id FROM compassion_child_pictures WHERE id IN %s "
+                "FOR UPDATE NOWAIT",
+                [tuple(self.ids)],
+            )
+        except OperationalError as e:
+            if e.pgcode == errorcodes.LOCK_NOT_AVAILABLE:
+                raise RetryableJobError(
+                    "Renditions are being generated by another job", seconds=10
+                )
+            raise
+        attachment_obj = self.env["ir.attachment"].sudo()
+        for picture in self.sudo():
+            existing = picture._get_renditions().mapped("name")
+            for field in RENDITION_FIELDS:
+                image = picture[field]
+                if not image:
+                    continue
+                for size, (width, height) in RENDITIONS.items():
+                    name = "rendition_{}_{}".format(field, size)
+                    if name in existing:
+                        continue
+                    attachment_obj.create({
+                        "name": name,
+                        "datas_fname": "{}_{}.jpg".format(field, size),
+                        "res_model": self._name,
+                        "res_id": picture.id,
+                        "datas": compress_big_images(image, width, height),
+                    })
+        return True
+
+    @api.multi
+    def get_rendition(self, field="fullshot", size="card"):
+        """
+        Get a resized version of the picture. The renditions are generated
+        once in a job and kept in attachments until the picture changes.
+        :param field: fullshot or headshot
+        :param size: one of the RENDITIONS keys
+        :return: ir.attachment record or empty recordset if it is not ready
+        """
+        self.ensure_one()
+        if field not in RENDITION_FIELDS or size not in RENDITIONS:
+            raise ValueError("Invalid picture rendition {} {}".format(field, size))
+        return self._get_renditions(field, size)[:1]
+
+    @api.multi
+    def get_rendition_url(self, field="fullshot", size="card"):
+        """
+        :return: URL of the picture rendition. It contains the checksum of
+                 the rendition so that browsers can cache it indefinitely.
+                 False if the rendition is not generated yet.
+        """
+        self.ensure_one()
+        rendition = self.get_rendition(field, size)
+        if not rendition:
+            return False
+        return "/my/picture/{}/{}/{}?unique={}".format(
+            self.id, field, size, rendition.checksum
+        )
@@ -0,0 +1,88 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+from datetime import timedelta
+
+from odoo import api, models, fields
+
+
+class ResPartner(models.Model):
+    _inherit = "res.partner"
+
+    @api.multi
+    def get_portal_donations_summary(self):
+        """
+        Gather the data displayed on the donations page of the portal.
+        It is computed with two aggregate queries instead of browsing all
+        invoices and contracts of the partner.
+        :return: dict with the following keys:
+            - paid_invoice_count: number of paid invoices
+            - due_invoice_ids: open sponsorship invoices of the next month
+            - first_year: year of the first paid invoice or False
+            - group_ids: payment groups of the active sponsorships
+            - amount_by_group: sponsorship amounts by group
+            - paid_sponsor_count_by_group: number of sponsorships by group
+            - wp_sponsor_count_by_group: number of W&P sponsorships by group
+        """
+        self.ensure_one()
+        today = fields.Date.today()
+        cr = self.env.cr
+        cr.execute(
+            """
+            SELECT
+                count(*) FILTER (WHERE state = 'paid'),
+                min(create_date) FILTER (WHERE state = 'paid'),
+                array_agg(id ORDER BY date_invoice DESC, number DESC, id DESC)
+                    FILTER (WHERE state = 'open'
+                            AND invoice_category = 'sponsorship'
+                            AND date_invoice < %(due_limit)s)
+            FROM account_invoice
+            WHERE partner_id = %(partner_id)s
+            AND type = 'out_invoice'
+            AND amount_total != 0
+        """,
+            {"partner_id": self.id, "due_limit": today + timedelta(days=30)},
+        )
+        paid_count, first_paid_date, due_invoice_ids = cr.fetchone()
+
+        cr.execute(
+            """
+            WITH active_group AS (
+                SELECT DISTINCT group_id FROM recurring_contract
+                WHERE partner_id = %(partner_id)s
+                AND type IN ('S', 'SC', 'SWP')
+                AND state NOT IN ('cancelled', 'terminated')
+                AND group_id IS NOT NULL
+            )
+            SELECT
+                g.group_id,
+                COALESCE(sum(l.amount) FILTER (
+                    WHERE c.type = 'S' AND l.amount != 42), 0),
+                count(DISTINCT c.id) FILTER (WHERE c.type = 'S'),
+                count(DISTINCT c.id) FILTER (WHERE c.type IN ('SC', 'SWP'))
+            FROM active_group g
+            LEFT JOIN recurring_contract c ON c.group_id = g.group_id
+                AND c.partner_id = %(partner_id)s
+                AND c.state NOT IN ('cancelled', 'terminated', 'draft')
+            LEFT JOIN recurring_contract_line l ON l.contract_id = c.id
+            GROUP BY g.group_id
+            ORDER BY g.group_id
+        """,
+            {"partner_id": self.id},
+        )
+        group_rows = cr.fetchall()
+        return {
+            "paid_invoice_count": paid_count,
+            "due_invoice_ids": due_invoice_ids or [],
+            "first_year": first_paid_date.year if first_paid_date else False,
+            "group_ids": [row[0] for row in group_rows],
+            "amount_by_group": [row[1] for row in group_rows],
+            "paid_sponsor_count_by_group": [row[2] for row in group_rows],
+            "wp_sponsor_count_by_group": [row[3] for row in group_rows],
+        }
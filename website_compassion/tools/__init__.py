@@ -7,4 +7,5 @@
 #    The licence is in the file __manifest__.py
 #
 ##############################################################################
-from . import image_compression
\ No newline at end of file
+from . import image_compression
+from . import zip_stream
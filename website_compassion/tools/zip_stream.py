@@ -0,0 +1,101 @@
+##############################################################################
+#
+#    Copyright (C) 2022 Compassion CH (http://www.compassion.ch)
+#    Releasing children from poverty in Jesus' name
+#    @author: Emanuel Cino <ecino@compassion.ch>
+#
+#    The licence is in the file __manifest__.py
+#
+##############################################################################
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile, ZIP_STORED
+
+_logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+CHUNK_SIZE = 64 * 1024
+
+
+class _StreamWriter:
+    """ Unseekable file object collecting the bytes written by ZipFile. """
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def _read_file(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _load(source):
+    """
+    Loads the content of an archive entry. This is run in worker threads and
+    must not touch the ORM.
+    :param source: a file path or the binary content of the file
+    :return: binary content or None if the file cannot be read
+    """
+    if isinstance(source, bytes):
+        return source
+    try:
+        return _read_file(source)
+    except OSError:
+        _logger.error("Cannot read file %s for the archive", source, exc_info=True)
+        return None
+
+
+def stream_zip(entries, max_workers=MAX_WORKERS):
+    """
+    Generates a ZIP archive chunk by chunk. The files are read ahead by a
+    small pool of threads, and at most max_workers files are kept in memory.
+
+    :param entries: list of tuples (path in archive, source) where source is
+                    either a file path or the binary content of the file.
+    :param max_workers: number of files read concurrently
+    :return: generator of bytes
+    """
+    writer = _StreamWriter()
+    entries = iter(entries)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+
+        def _submit_next():
+            for archive_path, source in entries:
+                pending.append((archive_path, executor.submit(_load, source)))
+                return
+
+        for _i in range(max_workers):
+            _submit_next()
+        # Pictures are already compressed: store them as is.
+        with ZipFile(writer, "w", ZIP_STORED) as archive:
+            while pending:
+                archive_path, future = pending.popleft()
+                _submit_next()
+                data = future.result()
+                if data is None:
+                    continue
+                with archive.open(archive_path, "w") as archive_file:
+                    for i in range(0, len(data), CHUNK_SIZE):
+                        archive_file.write(data[i:i + CHUNK_SIZE])
+                        yield writer.pop()
+                yield writer.pop()
+        yield writer.pop()